@@ -1,61 +1,47 @@
-from flask import Flask, request, Response, send_from_directory
+from flask import Flask, request, Response, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
-import difflib
+import math
 import sqlite3
 import traceback
 import random
 import os
-import requests
-import urllib.parse
+import time
 from xml.etree import ElementTree
-import pandas as pd
+
+import convlog
+import fanout
+import ledger
+from gazetteer import pharmacy_index
+from helpers import calculate_bmi, find_answer, make_progress_bar, normalize_city
+from knowledge_bundle import BundleStore
+from media import MediaLibrary
+from patient_cache import PatientCache
+from rate_limit import RateLimiter, THROTTLED_REPLY
+from schema import init_db
 
 # -------------------------------
 # Flask app and database setup
 # -------------------------------
 app = Flask(__name__)
-DB = "sampark.db"
-
-def init_db():
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            phone TEXT PRIMARY KEY,
-            name TEXT,
-            age INTEGER,
-            height REAL,
-            weight REAL,
-            checkins INTEGER DEFAULT 0,
-            family_member TEXT,
-            state TEXT DEFAULT 'new',
-            msg_count INTEGER DEFAULT 0,
-            city TEXT,
-            fam_name TEXT,
-            fam_relation TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+DB = os.environ.get("SAMPARK_DB", "sampark.db")
+
+init_db(DB)
+
+limiter = RateLimiter()
+patients = PatientCache()
+media_library = MediaLibrary()
+knowledge = BundleStore()
+if os.environ.get("SAMPARK_KNOWLEDGE_REFRESH", "1") == "1":
+    knowledge.start_refresher()
+if os.environ.get("SAMPARK_FANOUT", "1") == "1":
+    fanout.start_worker(DB)
+conversations = convlog.ConversationLog()
+if os.environ.get("SAMPARK_CONVLOG", "1") == "1":
+    conversations.start()
 
 # -------------------------------
-# FAQ, Recipes, and Tips
+# Recipes and Tips
 # -------------------------------
-FAQS = {
-    "what are side effects": "🤒 Common side effects: nausea, vomiting, constipation. Ginger tea + small meals help.\n(Type 'doctor' to connect to our experts)",
-    "how to store wegovy": "🧊 Store in fridge (2-8°C). Do not freeze.",
-    "can i take it at night": "🕒 Yes, morning or night — keep your schedule consistent.",
-    "what to do if i miss a dose": "💉 If <5 days late: take as soon as you remember. If >5 days: skip and continue your normal schedule.",
-    "how to reduce nausea": "🍵 Ginger tea, small frequent meals, avoid greasy food, stay hydrated.",
-    "when will i see weight loss": "📊 Usually between 4–8 weeks, varies by patient.",
-    "can i exercise": "🏃 Yes — combine diet + exercise for best results.",
-    "who should not take wegovy": "⚠️ Those with thyroid cancer history or MEN2 syndrome should avoid. Consult doctor.",
-    "what is the price": "💰 Price varies by pharmacy. Type 'doctor' to ask clinical or cost queries.",
-    "can i drink alcohol": "🍷 Light alcohol is usually safe, but avoid if it worsens nausea."
-}
-
 RECIPES = [
     "🥗 Quick recipe: Cucumber & tomato salad with lemon and olive oil — light and filling.",
     "🍲 Lentil & veggie soup: protein-rich and gentle on the stomach.",
@@ -72,32 +58,10 @@ DOCTOR_CONTACT = "👩‍⚕️ Connect to an expert here: https://example.com/c
 # -------------------------------
 # Helper Functions
 # -------------------------------
-def find_answer(user_text):
-    user_text = user_text.lower()
-    matches = difflib.get_close_matches(user_text, FAQS.keys(), n=1, cutoff=0.4)
-    return FAQS[matches[0]] if matches else None
-
-def make_progress_bar(current, total=12):
-    current = min(current, total)
-    filled = int((current / total) * 10) if total > 0 else 0
-    return "▰" * filled + "▱" * (10 - filled)
-
-def calculate_bmi(height_cm, weight_kg):
-    try:
-        h_m = float(height_cm) / 100.0
-        bmi = float(weight_kg) / (h_m ** 2)
-        if bmi < 18.5: category = "Underweight"
-        elif bmi < 25: category = "Normal"
-        elif bmi < 30: category = "Overweight"
-        else: category = "Obese"
-        return round(bmi, 1), category
-    except:
-        return None, None
-
 def safe_db_fetch(phone):
     conn = sqlite3.connect(DB)
     c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO users (phone, state, checkins, msg_count) VALUES (?, 'new', 0, 0)", (phone,))
+    c.execute("INSERT OR IGNORE INTO users (phone, state, checkins, msg_count, updated_at) VALUES (?, 'new', 0, 0, ?)", (phone, int(time.time())))
     conn.commit()
     c.execute("SELECT name, age, height, weight, checkins, family_member, state, msg_count, city, fam_name, fam_relation FROM users WHERE phone=?", (phone,))
     row = c.fetchone()
@@ -107,29 +71,21 @@ def safe_db_fetch(phone):
 def update_field(phone, field, value):
     conn = sqlite3.connect(DB)
     c = conn.cursor()
-    c.execute(f"UPDATE users SET {field}=? WHERE phone=?", (value, phone))
+    c.execute(f"UPDATE users SET {field}=?, updated_at=? WHERE phone=?", (value, int(time.time()), phone))
     conn.commit()
     conn.close()
+    patients.set_field(phone, field, value)
 
-# -------------------------------
-# City Normalization
-# -------------------------------
-CITY_MAP = {
-    "bengaluru": "Bangalore",
-    "bangalore": "Bangalore",
-    "bombay": "Mumbai",
-    "mumbai": "Mumbai",
-    "madras": "Chennai",
-    "chennai": "Chennai",
-    "delhi": "Delhi",
-    "new delhi": "Delhi"
-}
-
-def normalize_city(city: str):
-    if not city:
-        return None
-    city_norm = city.lower().strip()
-    return CITY_MAP.get(city_norm, city.title())
+def record_message(phone, msg_count):
+    now = int(time.time())
+    conn = sqlite3.connect(DB)
+    conn.execute("UPDATE users SET msg_count=?, last_msg_at=?, updated_at=? WHERE phone=?", (msg_count, now, now, phone))
+    conn.commit()
+    conn.close()
+    patients.set_field(phone, "msg_count", msg_count)
+
+def get_patient(phone):
+    return patients.get(phone, safe_db_fetch)
 
 # -------------------------------
 # Pharmacy Locator
@@ -138,64 +94,73 @@ def pharmacy_locator(city):
     if not city:
         return "⚠️ City not set. Please complete onboarding."
     city_std = normalize_city(city)
-    if city_std == "Bangalore":
-        try:
-            df = pd.read_csv("pharmacies_with_dosages.csv")
-        except FileNotFoundError:
-            return "⚠️ Pharmacy data not available. Please upload pharmacies_with_dosages.csv"
-        results = []
-        for _, row in df.iterrows():
-            results.append(f"{row['Name']} ({row['Type']}) — Dosages: {row.get('Dosages','N/A')}")
-        return "💊 Pharmacies in Bangalore:\n" + "\n".join(results[:5])
-    else:
-        return f"🌍 Pharmacy locator is currently available only for Bangalore. (Your city: {city_std})"
+    try:
+        index = pharmacy_index()
+    except FileNotFoundError:
+        return "⚠️ Pharmacy data not available. Please upload pharmacies_with_dosages.csv"
+    rows = index.in_city(city_std, limit=5)
+    if rows:
+        results = [f"{row['Name']} ({row['Type']}) — Dosages: {row.get('Dosages') or 'N/A'}" for row in rows]
+        return f"💊 Pharmacies in {city_std}:\n" + "\n".join(results)
+    nearest, km = index.nearest_city(city_std)
+    if nearest:
+        return f"🌍 No listed pharmacies in {city_std} yet. Nearest city with stock: {nearest} (~{km:.0f} km)."
+    return f"🌍 No listed pharmacies in {city_std} yet."
 
 # -------------------------------
 # Knowledge Hub (PubMed + Trials)
 # -------------------------------
-def fetch_pubmed(query="Wegovy AND Novo Nordisk AND obesity", max_results=3):
-    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
-    search_url = f"{base_url}esearch.fcgi?db=pubmed&term={urllib.parse.quote(query)}&retmax={max_results}&retmode=json"
-    try:
-        search_resp = requests.get(search_url, timeout=10).json()
-        pmids = search_resp.get("esearchresult", {}).get("idlist", [])
-    except Exception:
-        return ["⚠️ PubMed fetch failed."]
-    articles = []
-    for pmid in pmids:
-        try:
-            fetch_url = f"{base_url}efetch.fcgi?db=pubmed&id={pmid}&retmode=xml"
-            xml = requests.get(fetch_url, timeout=10).text
-            root = ElementTree.fromstring(xml)
-            title = root.findtext(".//ArticleTitle")
-            articles.append(f"• {title}\n🔗 https://pubmed.ncbi.nlm.nih.gov/{pmid}/")
-        except Exception:
-            continue
-    return articles or ["⚠️ No PubMed results."]
-
-def fetch_clinical_trials(query="Wegovy Novo Nordisk", max_results=3):
-    api_url = f"https://clinicaltrials.gov/api/query/study_fields?expr={urllib.parse.quote(query)}&fields=BriefTitle,Condition,OverallStatus,URL&min_rnk=1&max_rnk={max_results}&fmt=json"
-    try:
-        resp = requests.get(api_url, timeout=10)
-        data = resp.json()
-    except Exception:
-        return ["⚠️ ClinicalTrials.gov fetch failed."]
-    trials = []
-    for study in data.get("StudyFieldsResponse", {}).get("StudyFields", []):
-        title = study.get("BriefTitle", ["No title"])[0]
-        condition = study.get("Condition", [""])[0]
-        status = study.get("OverallStatus", [""])[0]
-        url = study.get("URL", [""])[0]
-        trials.append(f"• {title}\nCondition: {condition} | Status: {status}\n🔗 {url}")
-    return trials or ["⚠️ No clinical trials found."]
+def knowledge_hub_messages():
+    bundle = knowledge.reload_if_changed()
+    pubs = [f"• {a['title']}\n🔗 https://pubmed.ncbi.nlm.nih.gov/{a['pmid']}/" for a in bundle["articles"][:3]]
+    trials = [f"• {t['title']}\nCondition: {t['condition']} | Status: {t['status']}\n🔗 {t['url']}" for t in bundle["trials"][:3]]
+    return pubs or ["⚠️ No PubMed results yet — content is refreshing, please try later."], trials or ["⚠️ No clinical trials yet — content is refreshing, please try later."]
 
 # -------------------------------
-# Serve Video
+# Serve Video / Media
 # -------------------------------
+ONBOARDING_VIDEO = "onboarding.mp4"
+ONBOARDING_VIDEO_FALLBACK = "https://www.dropbox.com/scl/fi/kgizm8vb8uhdqlaxswqfx/onboarding.mp4?rlkey=7f5krq9j630jd8n2wp5fohypc&st=9eaijrh8&dl=1"
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "")
+
+def onboarding_video_url():
+    # Self-hosted (resumable, cacheable) when we know our public URL.
+    if PUBLIC_BASE_URL:
+        url = media_library.url_for(ONBOARDING_VIDEO, PUBLIC_BASE_URL)
+        if url:
+            return url
+    return ONBOARDING_VIDEO_FALLBACK
+
+@app.route('/media/<path:filename>')
+def media_files(filename):
+    return media_library.serve(filename)
+
+# Old links; now restricted to the media directory.
 @app.route('/video/<path:filename>')
 def video_files(filename):
-    folder = os.path.dirname(os.path.abspath(__file__))
-    return send_from_directory(folder, filename)
+    return media_library.serve(filename)
+
+# -------------------------------
+# Metrics
+# -------------------------------
+@app.route("/metrics")
+def metrics():
+    return jsonify({"rate_limit": limiter.stats(), "patient_cache": patients.stats(), "media": media_library.manifest(), "conversations": conversations.stats()})
+
+# -------------------------------
+# Conversation log (inbound + every outbound message)
+# -------------------------------
+@app.after_request
+def log_conversation(response):
+    if conversations.enabled and request.path == "/incoming" and request.method == "POST":
+        try:
+            phone = (request.values.get("From") or "").replace("whatsapp:", "")
+            conversations.record(phone, "in", request.values.get("Body") or "")
+            for body in ElementTree.fromstring(response.get_data()).iter("Body"):
+                conversations.record(phone, "out", body.text or "")
+        except Exception as e:
+            print("⚠️ Conversation log skipped:", str(e))
+    return response
 
 # -------------------------------
 # Main Webhook for WhatsApp
@@ -212,14 +177,19 @@ def incoming():
         resp = MessagingResponse()
         msg = resp.message()
 
-        row = safe_db_fetch(phone)
+        # ---- Rate limiting (before any DB work) ----
+        if not limiter.allow(phone, "cheap"):
+            msg.body(THROTTLED_REPLY)
+            return Response(str(resp), mimetype="application/xml")
+
+        row = get_patient(phone)
         if not row:
             msg.body("⚠️ Temporary DB error. Please try again in a moment.")
             return Response(str(resp), mimetype="application/xml")
 
         name, age, height, weight, checkins, family_member, state, msg_count, city, fam_name, fam_relation = row
         msg_count = (msg_count or 0) + 1
-        update_field(phone, "msg_count", msg_count)
+        record_message(phone, msg_count)
 
         # ---- Onboarding states ----
         if state == "new":
@@ -246,6 +216,8 @@ def incoming():
         if state == "awaiting_height":
             try:
                 h_val = float(body)
+                if not math.isfinite(h_val) or h_val <= 0:
+                    raise ValueError(body)
                 update_field(phone, "height", h_val)
                 update_field(phone, "state", "awaiting_weight")
                 msg.body("Great! Now tell me your *weight* in kg.")
@@ -256,9 +228,11 @@ def incoming():
         if state == "awaiting_weight":
             try:
                 w_val = float(body)
+                bmi, cat = calculate_bmi(height, w_val)
+                if bmi is None:
+                    raise ValueError(body)
                 update_field(phone, "weight", w_val)
                 update_field(phone, "state", "awaiting_city")
-                bmi, cat = calculate_bmi(height, w_val)
                 msg.body(f"✅ Saved your details!\nYour BMI is *{bmi}* ({cat}).\nWhich *city* are you from?")
             except:
                 msg.body("Please enter a valid weight in kg.")
@@ -281,8 +255,24 @@ def incoming():
             update_field(phone, "fam_relation", body.title())
             fam_info = f"{fam_name or ''} ({body.title()})"
             update_field(phone, "family_member", fam_info)
+            update_field(phone, "state", "awaiting_family_phone")
+            msg.body(f"📨 Family member added: {fam_info} ❤️\nWhat is their *WhatsApp number*? We'll send them your weekly progress. (Type 'skip' to leave it out)")
+            return Response(str(resp), mimetype="application/xml")
+
+        if state == "awaiting_family_phone":
+            fam_phone = None
+            if body_lc != "skip":
+                fam_phone = fanout.normalize_phone(body)
+                if not fam_phone:
+                    msg.body("Please enter a valid phone number (e.g., 9876543210), or type 'skip'.")
+                    return Response(str(resp), mimetype="application/xml")
+            fanout.add_partner(DB, phone, fam_name, fam_relation, fam_phone)
+            update_field(phone, "onboarded_at", int(time.time()))
             update_field(phone, "state", "ready")
-            msg.body(f"📨 Family member added: {fam_info} ❤️\nType 'menu' to see options.")
+            if fam_phone:
+                msg.body(f"💙 {fam_name or 'Your family member'} will get your check-in updates.\nType 'menu' to see options.")
+            else:
+                msg.body("👍 No problem!\nType 'menu' to see options.")
             return Response(str(resp), mimetype="application/xml")
 
         # ---- Menu ----
@@ -295,14 +285,14 @@ def incoming():
                 "4️⃣ Recipe\n"
                 "5️⃣ Pharmacy Locator\n"
                 "6️⃣ Knowledge Hub\n\n"
-                "Reply with a number (1-6), or just ask me your question!"
+                "Reply with a number (1-6), type 'wallet' for your points, or just ask me your question!"
             )
             msg.body(menu_text)
             return Response(str(resp), mimetype="application/xml")
 
         # ---- Menu options ----
         if body_lc == "1":
-            msg.body("📹 Watch the onboarding video here:\nhttps://www.dropbox.com/scl/fi/kgizm8vb8uhdqlaxswqfx/onboarding.mp4?rlkey=7f5krq9j630jd8n2wp5fohypc&st=9eaijrh8&dl=1")
+            msg.body("📹 Watch the onboarding video here:\n" + onboarding_video_url())
         elif body_lc == "2":
             msg.body(find_answer("what are side effects"))
         elif body_lc == "3":
@@ -312,31 +302,44 @@ def incoming():
         elif body_lc == "5":
             msg.body(pharmacy_locator(city))
         elif body_lc == "6":
-            pubs = fetch_pubmed()
-            trials = fetch_clinical_trials()
+            pubs, trials = knowledge_hub_messages()
             msg.body("🩺 *Knowledge Hub — PubMed*\n" + "\n\n".join(pubs))
             msg.body("🧪 *Clinical Trials*\n" + "\n\n".join(trials))
 
         # ---- Weekly check-in ----
         if body_lc in ("check-in", "checkin", "check in"):
-            if checkins < 12:
-                checkins += 1
-                update_field(phone, "checkins", checkins)
+            checkins, status = ledger.record_checkin(DB, phone)
+            if status == "recorded":
+                patients.set_field(phone, "checkins", checkins)
+                fanout.enqueue(DB, phone, "checkin", checkins)
                 reply = f"✅ Check-in recorded! Progress: {make_progress_bar(checkins)} ({checkins}/12 weeks)"
+                reply += f"\n⭐ +{ledger.POINTS_PER_CHECKIN} adherence points"
                 if checkins == 12:
                     reply += "\n🎉 Challenge complete!"
                 elif checkins == 6:
                     reply += "\n👏 Halfway there!"
                 reply += "\n\n" + random.choice(HYDRATION_TIPS) + "\n" + random.choice(RECIPES)
+            elif status == "this_week":
+                reply = f"🗓️ You’ve already checked in this week. Progress: {make_progress_bar(checkins)} ({checkins}/12 weeks)\nSee you next week!"
             else:
                 reply = "✅ You’ve already completed all 12 weeks! 🎉 Challenge already complete."
             msg.body(reply)
 
+        # ---- Wallet ----
+        if body_lc in ("wallet", "points"):
+            w = ledger.wallet(DB, phone)
+            reply = f"💰 *Wallet*\nAdherence points: {w['points']}\nWeeks checked-in: {w['weeks']}/12"
+            if w["cashback_status"] != "none":
+                reply += f"\n🎉 ₹{w['cashback']} cashback {w['cashback_status']}"
+            else:
+                reply += "\nComplete ≥90% adherence to unlock ₹500 cashback."
+            msg.body(reply)
+
         # ---- Fallback ----
         ans = find_answer(body_lc)
         if ans:
             msg.body(ans)
-        elif body_lc not in ("1","2","3","4","5","6","check-in","checkin","check in","doctor"):
+        elif body_lc not in ("1","2","3","4","5","6","check-in","checkin","check in","doctor","wallet","points"):
             msg.body("🤔 Sorry, I didn't get that. Type 'menu' to see options or ask me anything about Wegovy.")
 
         # ---- Hydration reminder ----
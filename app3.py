@@ -1,34 +1,22 @@
 import random
 import os
 import html
-import re
 import sqlite3
 import urllib.parse
 
 import pandas as pd
 import folium
-import requests
 import altair as alt
 import streamlit as st
 from streamlit_folium import st_folium
 from streamlit_autorefresh import st_autorefresh
-from xml.etree import ElementTree
+
+from gazetteer import default_gazetteer, pharmacy_index
+from helpers import calculate_bmi, find_answer, normalize_city, normalize_relation, RELATIONS
+from knowledge_bundle import BundleStore
 # -----------------------
 # Helper content
 # -----------------------
-FAQS = {
-    "side effects": "🤒 Common side effects: nausea, vomiting, constipation. Ginger tea + small meals help.",
-    "storage": "🧊 Store in fridge (2-8°C). Do not freeze.",
-    "dose timing": "🕒 Morning or night — keep your schedule consistent.",
-    "missed dose": "💉 If <5 days late: take when you remember. If >5 days: skip and continue your normal schedule.",
-    "reduce nausea": "🍵 Ginger tea, small frequent meals, avoid greasy food, stay hydrated.",
-    "weight loss": "📊 Usually between 4–8 weeks, varies by patient.",
-    "exercise": "🏃 Yes — combine diet + exercise for best results.",
-    "contraindications": "⚠️ Avoid if thyroid cancer history or MEN2 syndrome. Consult doctor.",
-    "price": "💰 Price varies by pharmacy.",
-    "alcohol": "🍷 Light alcohol is usually safe, but avoid if it worsens nausea."
-}
-
 RECIPES = [
     "🥗 Cucumber & tomato salad with lemon — light and filling.",
     "🍲 Lentil & veggie soup — protein-rich and gentle on the stomach.",
@@ -40,38 +28,16 @@ DOCTOR_CONTACT = "👩‍⚕️ Connect to an expert: https://example.com/connec
 # -----------------------
 # Helpers
 # -----------------------
-def calculate_bmi(height_cm, weight_kg):
-    try:
-        h_m = float(height_cm) / 100
-        bmi = weight_kg / (h_m ** 2)
-        if bmi < 18.5: cat = "Underweight"
-        elif bmi < 25: cat = "Normal"
-        elif bmi < 30: cat = "Overweight"
-        else: cat = "Obese"
-        return round(bmi, 1), cat
-    except:
-        return None, None
-
 def avatar_for(name):
     emojis = ["🟢","🔵","🟣","🟡","🔴","🟠","🟤"]
     return emojis[hash(name) % len(emojis)]
 
-_REL_MAP = {
-    "brother": "Sibling", "sister": "Sibling", "sibling": "Sibling",
-    "mom": "Parent", "mother": "Parent", "mum": "Parent",
-    "dad": "Parent", "father": "Parent",
-    "husband": "Spouse", "wife": "Spouse", "spouse": "Spouse",
-    "friend": "Friend", "buddy": "Friend"
-}
-_STOPWORDS = {"as", "is", "my", "the", "a", "an", "named"}
-
-def normalize_relation(raw: str) -> str:
-    if not raw: return "Other"
-    key = re.sub(r'[^a-zA-Z]', '', raw).lower().strip()
-    if key in _REL_MAP: return _REL_MAP[key]
-    title = raw.strip().title()
-    if title in ["Spouse", "Parent", "Sibling", "Friend"]: return title
-    return "Other"
+@st.cache_resource
+def knowledge_store():
+    # One bundle store per server process, shared by every session.
+    store = BundleStore()
+    store.start_refresher()
+    return store
 
 # -----------------------
 # Session state initialization
@@ -196,7 +162,7 @@ if page == "Onboarding Chat":
                 reply = "Please enter a valid weight in kg."
 
         elif profile["state"] == "awaiting_city":
-            profile["city"] = msg.title()
+            profile["city"] = normalize_city(msg)
             profile["state"] = "awaiting_family_name"
             reply = f"Got it! You’re from {profile['city']} 🌆.\nPlease tell me your family member’s *name*."
 
@@ -237,10 +203,10 @@ elif page == "Menu (once ready)":
         st.subheader(f"Welcome, {profile['name']} 👋")
         menu_choice = st.radio("Choose an option:", ["Onboarding Video", "Side-effect Tips", "Weekly Check-in", "Recipe", "Ask a Question", "Doctor Contact"])
         if menu_choice == "Onboarding Video":
-            video_path = "onboarding.mp4"
+            video_path = os.path.join("media", "onboarding.mp4")
             if os.path.exists(video_path): st.video(video_path)
             else: st.warning("Onboarding video not found — showing sample instead."); st.video("https://www.w3schools.com/html/mov_bbb.mp4")
-        elif menu_choice == "Side-effect Tips": st.info(FAQS["side effects"])
+        elif menu_choice == "Side-effect Tips": st.info(find_answer("side effects"))
         elif menu_choice == "Weekly Check-in":
             profile["checkins"] = min(profile["checkins"]+1, 12); profile["points"] = profile["checkins"] * 10
             done = profile["checkins"]; st.success(f"✅ Check-in recorded! Progress: {done}/12 weeks"); st.progress(min(done/12, 1.0))
@@ -254,8 +220,7 @@ elif page == "Menu (once ready)":
             if "ask_q" not in st.session_state: st.session_state.ask_q = ""
             if "last_answer" not in st.session_state: st.session_state.last_answer = ""
             def handle_question():
-                q = st.session_state.ask_q.strip().lower()
-                ans = next((FAQS[k] for k in FAQS if k in q), None)
+                ans = find_answer(st.session_state.ask_q)
                 st.session_state.last_answer = str(ans) if ans else "🤔 Sorry, I don’t have an answer for that yet."
             st.text_input("Ask me about Wegovy (e.g., 'side effects', 'storage')", key="ask_q", on_change=handle_question)
             if st.session_state.last_answer:
@@ -270,7 +235,7 @@ elif page == "Family Stack":
     st.subheader("Family Stack — Manage Care Partners")
     with st.form("manual_add", clear_on_submit=True):
         name = st.text_input("Care partner name", key="manual_name")
-        relation_select = st.selectbox("Relation", ["Spouse","Parent","Sibling","Friend","Other"], key="manual_rel")
+        relation_select = st.selectbox("Relation", RELATIONS, key="manual_rel")
         submitted = st.form_submit_button("Invite (simulate)")
         if submitted:
             if name.strip():
@@ -291,13 +256,13 @@ elif page == "Family Stack":
             if st.session_state.get(f"editing_{idx}", False):
                 with st.form(f"edit_form_{idx}", clear_on_submit=False):
                     new_name = st.text_input("Name", value=cp["name"], key=f"edit_name_{idx}")
-                    new_rel = st.selectbox("Relation", ["Spouse","Parent","Sibling","Friend","Other"], index=["Spouse","Parent","Sibling","Friend","Other"].index(cp["relation"]) if cp["relation"] in ["Spouse","Parent","Sibling","Friend","Other"] else 4, key=f"edit_rel_{idx}")
+                    new_rel = st.selectbox("Relation", RELATIONS, index=RELATIONS.index(cp["relation"]) if cp["relation"] in RELATIONS else 4, key=f"edit_rel_{idx}")
                     save = st.form_submit_button("Save"); cancel = st.form_submit_button("Cancel")
                     if save: st.session_state.care_partners[idx] = {"name": new_name.strip().title(), "relation": normalize_relation(new_rel)}; st.session_state[f"editing_{idx}"] = False; st.experimental_rerun()
                     if cancel: st.session_state[f"editing_{idx}"] = False; st.experimental_rerun()
 
 # -----------------------
-# Pharmacy Locator (with city alias mapping)
+# Pharmacy Locator (gazetteer-backed, any city)
 # -----------------------
 elif page == "Pharmacy Locator":
     st.subheader("💊 Pharmacy Locator")
@@ -306,54 +271,49 @@ elif page == "Pharmacy Locator":
         st.warning("⚠️ Please complete onboarding and enter your city first.")
     else:
         # ✅ Normalize user city with alias mapping
-        city_aliases = {
-            "bangalore": "bangalore",
-            "bengaluru": "bangalore",
-            "bombay": "mumbai",
-            "madras": "chennai",
-            "delhi": "delhi",
-            "new delhi": "delhi"
-        }
-
-        user_city = profile["city"].lower().strip()
-        normalized_city = city_aliases.get(user_city, user_city)
+        normalized_city = normalize_city(profile["city"])
 
         st.markdown(f"### Showing pharmacy locations for **{profile['city']}**")
 
-        if normalized_city == "bangalore":
-            try:
-                df = pd.read_csv("pharmacies_with_dosages.csv")  # Name, Type, Latitude, Longitude, Dosages
-            except FileNotFoundError:
-                st.error("⚠️ pharmacies_with_dosages.csv not found. Please upload it.")
-                df = None
-
-            if df is not None:
-                st.dataframe(df)
-
-                # Center map on Bangalore
-                bangalore_coords = [12.9716, 77.5946]
-                m = folium.Map(location=bangalore_coords, zoom_start=12)
-
-                # Add markers
-                for _, row in df.iterrows():
-                    color = "green" if row['Type'] == "Offline" else "red"
-                    dosage_info = row['Dosages'] if 'Dosages' in df.columns else "Not specified"
-                    tooltip_text = f"{row['Name']} — {row['Type']} | Dosages: {dosage_info}"
-
-                    folium.Marker(
-                        [row['Latitude'], row['Longitude']],
-                        tooltip=tooltip_text,
-                        icon=folium.Icon(color=color, icon="info-sign")
-                    ).add_to(m)
-
-                # ✅ Render map as HTML iframe (bypasses JSON serialization error)
-                map_html = m._repr_html_()
-                st.components.v1.html(map_html, height=500)
+        try:
+            index = pharmacy_index()
+        except FileNotFoundError:
+            st.error("⚠️ pharmacies_with_dosages.csv not found. Please upload it.")
+            index = None
+
+        rows = index.in_city(normalized_city) if index else []
+        if rows:
+            df = pd.DataFrame(rows).drop(columns=["_km"])
+            st.dataframe(df)
+
+            # Center map on the city's centroid from the gazetteer
+            city_coords = list(default_gazetteer().coordinates(normalized_city))
+            m = folium.Map(location=city_coords, zoom_start=12)
+
+            # Add markers
+            for _, row in df.iterrows():
+                color = "green" if row['Type'] == "Offline" else "red"
+                dosage_info = row['Dosages'] if 'Dosages' in df.columns else "Not specified"
+                tooltip_text = f"{row['Name']} — {row['Type']} | Dosages: {dosage_info}"
+
+                folium.Marker(
+                    [row['Latitude'], row['Longitude']],
+                    tooltip=tooltip_text,
+                    icon=folium.Icon(color=color, icon="info-sign")
+                ).add_to(m)
+
+            # ✅ Render map as HTML iframe (bypasses JSON serialization error)
+            map_html = m._repr_html_()
+            st.components.v1.html(map_html, height=500)
+
+        elif index is not None:
+            nearest, km = index.nearest_city(normalized_city)
+            if nearest:
+                st.info(f"🌍 No listed pharmacies in **{normalized_city}** yet. "
+                        f"Nearest city with stock: **{nearest}** (~{km:.0f} km).")
+            else:
+                st.info(f"🌍 No listed pharmacies in **{profile['city']}** yet.")
 
-        else:
-            st.info(f"🌍 Pharmacy locator is currently available only for Bangalore. "
-                    f"We can add support for **{profile['city']}** in the future.")
-            
 # -----------------------
 # Commit & Earn
 # -----------------------
@@ -379,38 +339,12 @@ elif page == "Commit & Earn":
 # -----------------------
 elif page == "Knowledge Hub":
     st.subheader("🩺 Knowledge Hub - Wegovy (Novo Nordisk)")
-    def fetch_pubmed(query="Wegovy AND Novo Nordisk AND obesity AND India", max_results=5):
-        base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
-        search_url = f"{base_url}esearch.fcgi?db=pubmed&term={query}&retmax={max_results}&retmode=json"
-        try: search_resp = requests.get(search_url, timeout=10).json()
-        except (requests.exceptions.RequestException, ValueError): return []
-        pmids = search_resp.get("esearchresult", {}).get("idlist", []); articles = []
-        for pmid in pmids:
-            try:
-                fetch_url = f"{base_url}efetch.fcgi?db=pubmed&id={pmid}&retmode=xml"; fetch_resp = requests.get(fetch_url, timeout=10).text
-                root = ElementTree.fromstring(fetch_resp)
-                articles.append({"pmid": pmid, "title": root.findtext(".//ArticleTitle"), "abstract": root.findtext(".//AbstractText")})
-            except Exception: continue
-        return articles
-
-    success_stories = [
-        {"title": "Novo Nordisk announces Wegovy approval for obesity management","description": "Wegovy has been approved as a treatment for adults with obesity, showing significant efficacy in clinical trials.","url": "https://www.novonordisk.com/media/news-details.2337680.html","source": "Novo Nordisk News"},
-        {"title": "Clinical trial results: Wegovy for weight management","description": "Phase 3 clinical trials demonstrate substantial weight loss in patients treated with Wegovy.","url": "https://www.ncbi.nlm.nih.gov/pmc/articles/PMC8463470/","source": "PubMed Central"},
-        {"title": "Real-world outcomes with Wegovy","description": "Patients using Wegovy report positive weight management outcomes, supporting clinical trial results.","url": "https://www.ncbi.nlm.nih.gov/pmc/articles/PMC8569585/","source": "PubMed Central"}
-    ]
-
-    def fetch_clinical_trials(query="Wegovy Novo Nordisk", max_results=5):
-        api_url = f"https://clinicaltrials.gov/api/query/study_fields?expr={urllib.parse.quote(query)}&fields=BriefTitle,Condition,OverallStatus,URL&min_rnk=1&max_rnk={max_results}&fmt=json"
-        try: resp = requests.get(api_url, timeout=10); resp.raise_for_status(); data = resp.json()
-        except (requests.exceptions.RequestException, ValueError): return []
-        trials = []
-        for study in data.get("StudyFieldsResponse", {}).get("StudyFields", []):
-            trials.append({"title": study.get("BriefTitle", ["No title"])[0],"condition": study.get("Condition", [""])[0],"status": study.get("OverallStatus", [""])[0],"url": study.get("URL", [""])[0]})
-        return trials
+    bundle = knowledge_store().reload_if_changed()
+    articles, trials, success_stories = bundle["articles"], bundle["trials"], bundle["stories"]
+    if bundle["built_at"]: st.caption(f"Content bundle v{bundle['version']} — updated {bundle['built_at']}")
 
-    if st.button("📥 Fetch Latest Articles & Trials"):
+    if st.button("📥 Show Latest Articles & Trials"):
         st.header("📄 Research Articles")
-        articles = fetch_pubmed()
         if not articles: st.warning("No PubMed articles found.")
         else:
             for art in articles:
@@ -427,7 +361,6 @@ elif page == "Knowledge Hub":
             st.markdown("---")
 
         st.header("🧪 NIH Clinical Trials")
-        trials = fetch_clinical_trials()
         if not trials: st.warning("No clinical trials found.")
         else:
             for t in trials:
@@ -0,0 +1,334 @@
+"""Invariant checks and performance regression gate for the shared helpers.
+
+    python bench.py              # check invariants, time, compare to baseline
+    python bench.py --update     # re-record bench_baseline.json on this machine
+    python bench.py --threshold 0.5
+    python bench.py --db fixtures/cohort-1M.db --pharmacies fixtures/pharmacies-1M.csv \
+                    --baseline bench_baseline-1M.json   # against a cohort.py fixture
+
+Exits non-zero if an invariant fails or any benchmark is slower than its
+baseline by more than the threshold (default 50%) after being re-timed. If there is no baseline
+file yet, nothing is compared: the run passes and writes one, so record the
+baseline on the same machine before relying on the gate.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import timeit
+
+from gazetteer import default_gazetteer, pharmacy_index
+from helpers import calculate_bmi, find_answer, make_progress_bar, normalize_city, normalize_relation, FAQS, FAQ_KEYWORDS, RELATIONS
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+THRESHOLD = 0.5
+FIXTURE_DB = None  # --db
+REPEAT = 7
+RETRIES = 2
+MIN_RUN_SECONDS = 0.3
+
+# -------------------------------
+# Random inputs
+# -------------------------------
+def _noisy(rng, text):
+    text = "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+    return " " * rng.randint(0, 2) + text + " " * rng.randint(0, 2)
+
+def _typo(rng, text):
+    # Drop, duplicate or swap one character.
+    if len(text) < 5:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.randrange(3)
+    if op == 0:
+        return text[:i] + text[i + 1:]
+    if op == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+def _junk(rng):
+    return "".join(rng.choice(string.ascii_letters + " -.") for _ in range(rng.randint(0, 12)))
+
+# -------------------------------
+# Invariants (property checks over seeded random inputs)
+# -------------------------------
+def check_invariants(seed=0, n=5000):
+    rng = random.Random(seed)
+    failures = []
+    aliases = default_gazetteer().aliases()
+
+    def expect(ok, what):
+        if not ok and len(failures) < 20:
+            failures.append(what)
+
+    for _ in range(n):
+        h = rng.uniform(50, 250)
+        w = rng.uniform(20, 300)
+        bmi, cat = calculate_bmi(h, w)
+        expect(calculate_bmi(str(h), str(w)) == (bmi, cat), f"calculate_bmi not stable under str input: {h}, {w}")
+        raw = w / (h / 100.0) ** 2
+        expect(abs(bmi - raw) <= 0.05 + 1e-9, f"calculate_bmi {bmi} is not {raw:.3f} rounded for {h}, {w}")
+        want = "Underweight" if raw < 18.5 else "Normal" if raw < 25 else "Overweight" if raw < 30 else "Obese"
+        expect(cat == want, f"calculate_bmi category {cat} != {want} for {h}, {w}")
+
+        c = rng.randint(-20, 40)
+        bar = make_progress_bar(c)
+        expect(len(bar) == 10, f"make_progress_bar length {len(bar)} for {c}")
+        expect(bar.count("▰") <= make_progress_bar(c + 1).count("▰"), f"make_progress_bar not monotonic at {c}")
+        expect(make_progress_bar(c) == make_progress_bar(max(0, min(12, c))), f"make_progress_bar not clamped at {c}")
+
+        alias, canonical = rng.choice(aliases)
+        expect(normalize_city(_noisy(rng, alias)) == canonical, f"normalize_city({alias!r}) with noise")
+        typo = _typo(rng, alias)
+        # (Skip typos that are themselves an alias or an alias prefix: those resolve by design.)
+        if not any(a.startswith(typo) for a, _ in aliases):
+            expect(normalize_city(typo) in (canonical, typo.title()), f"normalize_city({typo!r}) bound to another city")
+        junk = _junk(rng)
+        once = normalize_city(junk)
+        expect(normalize_city(once) == once, f"normalize_city not idempotent for {junk!r}")
+
+        question = rng.choice(list(FAQS))
+        for asked in (_noisy(rng, question), question + "?", rng.choice(FAQ_KEYWORDS[question])):
+            expect(find_answer(asked) == FAQS[question], f"find_answer({asked!r}) is not the answer to {question!r}")
+
+        rel = normalize_relation(_junk(rng))
+        expect(rel in RELATIONS, f"normalize_relation returned {rel!r}")
+        expect(normalize_relation(rel) == rel, f"normalize_relation not idempotent for {rel!r}")
+
+    # Reference values worked out by hand: (height cm, weight kg) -> (BMI, category).
+    for h, w, want in ((170, 70, (24.2, "Normal")), (160, 47, (18.4, "Underweight")), (100, 18.5, (18.5, "Normal")),
+                       (100, 25, (25.0, "Overweight")), (180, 97.2, (30.0, "Obese")), ("162", "81", (30.9, "Obese"))):
+        expect(calculate_bmi(h, w) == want, f"calculate_bmi({h!r}, {w!r}) = {calculate_bmi(h, w)}, expected {want}")
+    for c, filled in ((0, 0), (1, 0), (6, 5), (11, 9), (12, 10), (-3, 0), (30, 10)):
+        expect(make_progress_bar(c) == "▰" * filled + "▱" * (10 - filled), f"make_progress_bar({c}) should have {filled} filled")
+    for raw, want in (("Mom", "Parent"), (" WIFE ", "Spouse"), ("brother", "Sibling"), ("Buddy", "Friend"), ("neighbour", "Other"), ("", "Other")):
+        expect(normalize_relation(raw) == want, f"normalize_relation({raw!r}) should be {want!r}")
+    # Real places missing from cities.csv must be kept as typed, not bound to
+    # a near-spelled city; single typos of listed ones still resolve.
+    for raw in ("Rampur", "Raigarh", "Ratlam", "Karnal", "Panvel", "Satna", "Rewa"):
+        expect(normalize_city(raw) == raw, f"normalize_city({raw!r}) should stay {raw!r}")
+    for raw, want in (("banglore", "Bangalore"), ("chenai", "Chennai"), ("Jaipr", "Jaipur"), ("Dehli", "Delhi"),
+                      ("hyderbad", "Hyderabad"), ("kolkatta", "Kolkata"), ("Bengalaru", "Bangalore")):
+        expect(normalize_city(raw) == want, f"normalize_city({raw!r}) should be {want!r}")
+    for text in ("", "   ", "?!"):
+        expect(find_answer(text) is None, f"find_answer({text!r}) should be None")
+
+    for bad in (None, "", "abc", 0, "0", 1e200, 1e-155, "inf", "nan", float("nan")):
+        expect(calculate_bmi(bad, 70) == (None, None), f"calculate_bmi({bad!r}, 70) should be (None, None)")
+    for bad in (-70, 1e308 * 10, "-inf", float("nan")):
+        expect(calculate_bmi(170, bad) == (None, None), f"calculate_bmi(170, {bad!r}) should be (None, None)")
+    return failures
+
+# -------------------------------
+# Benchmarks
+# -------------------------------
+def _bench_helpers(rng):
+    heights = [rng.uniform(140, 200) for _ in range(1000)]
+    weights = [rng.uniform(40, 150) for _ in range(1000)]
+    aliases = [a for a, _ in default_gazetteer().aliases()]
+    cities = [_noisy(rng, rng.choice(aliases)) if rng.random() < 0.7 else _junk(rng) for _ in range(1000)]
+    relations = [_junk(rng) if rng.random() < 0.3 else _noisy(rng, rng.choice(["mom", "brother", "wife", "friend"])) for _ in range(1000)]
+    counts = [rng.randint(-2, 14) for _ in range(1000)]
+    return {
+        "calculate_bmi": lambda: [calculate_bmi(h, w) for h, w in zip(heights, weights)],
+        "make_progress_bar": lambda: [make_progress_bar(c) for c in counts],
+        "normalize_city": lambda: [normalize_city(c) for c in cities],
+        "normalize_relation": lambda: [normalize_relation(r) for r in relations],
+    }
+
+def _bench_webhook(rng):
+    # Needs the bot's runtime deps (flask, twilio, pandas); skipped without them.
+    # Never start the bot's workers here: with Twilio credentials exported the
+    # fan-out worker would message the fixture's synthetic partner numbers.
+    for flag in ("SAMPARK_KNOWLEDGE_REFRESH", "SAMPARK_FANOUT", "SAMPARK_CONVLOG"):
+        os.environ[flag] = "0"
+    # The warm-up onboards a test patient, so it writes to a throwaway copy
+    # of the --db fixture (or an empty temp DB), never the fixture itself.
+    db = os.path.join(tempfile.mkdtemp(), "bench.db")
+    if FIXTURE_DB:
+        shutil.copyfile(FIXTURE_DB, db)
+    os.environ["SAMPARK_DB"] = db
+    try:
+        import app as bot
+    except ImportError as e:
+        print(f"skip webhook benchmarks ({e})")
+        return {}
+    from rate_limit import RateLimiter
+
+    bot.limiter = RateLimiter(budgets={"cheap": (10**9, 0)})
+    client = bot.app.test_client()
+    phone = "whatsapp:+910000000001"
+    for body in ("hi", "Asha", "34", "162", "81", "Bangalore", "Ravi", "Brother", "skip"):
+        client.post("/incoming", data={"From": phone, "Body": body})
+    questions = [_noisy(rng, q) for q in FAQS]
+    return {
+        "find_answer": lambda: [find_answer(q) for q in questions],
+        "webhook_menu": lambda: client.post("/incoming", data={"From": phone, "Body": "menu"}),
+        "webhook_faq": lambda: client.post("/incoming", data={"From": phone, "Body": "how to store wegovy"}),
+    }
+
+def _bench_gazetteer(rng):
+    g = default_gazetteer()
+    index = pharmacy_index()
+    aliases = [a for a, _ in g.aliases()]
+    # Noisy inputs: mixed case/whitespace, one-character typos, and junk.
+    noisy = []
+    for _ in range(1000):
+        r = rng.random()
+        if r < 0.5:
+            noisy.append(_noisy(rng, rng.choice(aliases)))
+        elif r < 0.85:
+            noisy.append(_typo(rng, rng.choice(aliases)))
+        else:
+            noisy.append(_junk(rng))
+    names = [rng.choice(list(g.cities)) for _ in range(1000)]
+    return {
+        "city_resolve_noisy": lambda: [g.resolve(t) for t in noisy],
+        "pharmacy_in_city": lambda: [index.in_city(n, limit=5) for n in names],
+    }
+
+def _bench_cohort(rng):
+    # Only with --db: indexed, read-only lookups against a cohort.py fixture.
+    db = FIXTURE_DB
+    if not db or not os.path.exists(db):
+        return {}
+    import sqlite3
+    import risk
+
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    last = conn.execute("SELECT MAX(rowid) FROM users").fetchone()[0] or 0
+    phones = [row[0] for row in (conn.execute("SELECT phone FROM users WHERE rowid = ?", (rng.randint(1, last),)).fetchone()
+                                 for _ in range(1000)) if row]
+
+    def lookups():
+        for phone in phones:
+            conn.execute("SELECT name, age, height, weight, checkins, family_member, state, msg_count, city, fam_name, fam_relation "
+                         "FROM users WHERE phone = ?", (phone,)).fetchone()
+    benches = {"cohort_patient_lookup": lookups}
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'risk_scores'").fetchone():
+        benches["cohort_risk_top20"] = lambda: risk.top_at_risk(db, 20)
+    return benches
+
+def _bench_media(rng, clients=8, requests_per_client=4, chunk=256 * 1024, size=16 * 1024 * 1024):
+    # Concurrent range clients against a real threaded HTTP server.
+    try:
+        import threading
+        import urllib.request
+        from concurrent.futures import ThreadPoolExecutor
+        from flask import Flask
+        from werkzeug.serving import make_server
+        from media import MediaLibrary
+    except ImportError as e:
+        print(f"skip media benchmarks ({e})")
+        return {}
+
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, "clip.mp4"), "wb") as f:
+        f.write(os.urandom(size))
+    library = MediaLibrary(tmp)
+    web = Flask("bench_media")
+    web.add_url_rule("/media/<path:filename>", "media", lambda filename: library.serve(filename))
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, web, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/media/clip.mp4"
+    offsets = [rng.randrange(0, size - chunk) for _ in range(clients * requests_per_client)]
+
+    def fetch(offset):
+        req = urllib.request.Request(url, headers={"Range": f"bytes={offset}-{offset + chunk - 1}"})
+        with urllib.request.urlopen(req) as r:
+            assert r.status == 206
+            return len(r.read())
+
+    pool = ThreadPoolExecutor(max_workers=clients)
+    return {
+        f"media_range_{clients}x{requests_per_client}x{chunk // 1024}k": lambda: sum(pool.map(fetch, offsets)),
+    }
+
+BENCH_GROUPS = [_bench_helpers, _bench_gazetteer, _bench_cohort, _bench_media, _bench_webhook]
+
+def _time(fn, repeat=REPEAT, min_run_seconds=MIN_RUN_SECONDS):
+    # Each timed run loops the workload for at least min_run_seconds and the
+    # fastest of `repeat` runs is kept: noise (scheduling, other processes)
+    # only ever adds time, so the minimum is the stable estimate.
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_run_seconds / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run_benchmarks(seed=0):
+    # Returns ({name: seconds per iteration}, {name: workload}).
+    rng = random.Random(seed)
+    results, workloads = {}, {}
+    for group in BENCH_GROUPS:
+        for name, fn in group(rng).items():
+            workloads[name] = fn
+            results[name] = _time(fn)
+    return results, workloads
+
+# -------------------------------
+# CLI
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the current timings as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown vs baseline (0.5 = 50%%)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="run against this database (e.g. a cohort.py fixture) instead of a temp one")
+    parser.add_argument("--pharmacies", help="national pharmacy CSV to index instead of pharmacies_with_dosages.csv")
+    args = parser.parse_args(argv)
+    global FIXTURE_DB
+    FIXTURE_DB = args.db
+    if args.pharmacies:
+        os.environ["SAMPARK_PHARMACIES"] = args.pharmacies
+
+    failures = check_invariants(args.seed)
+    for f in failures:
+        print(f"❌ invariant: {f}")
+    if failures:
+        return 1
+    print("✅ invariants hold")
+
+    results, workloads = run_benchmarks(args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.update:
+        print(f"⚠️ no baseline at {args.baseline}: nothing compared, recording one")
+
+    def over(name):
+        return name in baseline and results[name] / baseline[name] - 1 > args.threshold
+
+    # A regression has to reproduce: suspects are re-timed and keep their best.
+    for name in sorted(results):
+        for _ in range(RETRIES):
+            if not over(name):
+                break
+            results[name] = min(results[name], _time(workloads[name]))
+
+    regressed = []
+    for name, secs in sorted(results.items()):
+        base = baseline.get(name)
+        note = ""
+        if base:
+            note = f"{secs / base - 1:+.0%} vs baseline"
+            if over(name):
+                regressed.append(name)
+                note += "  ❌ REGRESSION"
+        print(f"{name:24s} {secs * 1e3:10.3f} ms/iter  {note}")
+
+    if args.update or not baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"📝 baseline written to {args.baseline}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Synthetic patient cohort + national pharmacy file for scale testing.
+
+    python cohort.py 10000                  # fixtures/cohort-10k.db + fixtures/pharmacies-10k.csv
+    python cohort.py 1000000 --seed 7
+    python cohort.py 10000000 --pharmacies 200000 --now 1790000000
+
+Same N, --seed and --now give identical rows. Timestamps are relative to
+--now (default: today, 00:00 UTC). Rows are generated and written
+CHUNK_ROWS at a time in one transaction each, so memory stays flat at any N.
+
+Point the bot, dashboard and benchmarks at a fixture with
+SAMPARK_DB=fixtures/cohort-1M.db SAMPARK_PHARMACIES=fixtures/pharmacies-1M.csv
+or `python bench.py --db ... --pharmacies ...`.
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import ledger
+import risk
+from gazetteer import default_gazetteer
+from schema import init_db
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CHUNK_ROWS = 100_000
+
+PROGRAM_WEEKS = 12
+WEEK_SECONDS = 7 * 24 * 60 * 60
+DAY_SECONDS = 24 * 60 * 60
+MAX_ENROLLED_WEEKS = 16
+
+PATIENT_PHONE_BASE = 7_000_000_000
+PARTNER_PHONE_BASE = 8_000_000_000
+
+# Onboarding funnel, in the order app.py walks it; the last entry is 'ready'.
+STATES = ["new", "awaiting_name", "awaiting_age", "awaiting_height", "awaiting_weight",
+          "awaiting_city", "awaiting_family_name", "awaiting_family_relation",
+          "awaiting_family_phone", "ready"]
+STATE_WEIGHTS = [0.04, 0.03, 0.02, 0.02, 0.02, 0.015, 0.015, 0.01, 0.01, 0.82]
+
+FIRST_NAMES = ["Aarav", "Aditi", "Amit", "Ananya", "Anil", "Arjun", "Asha", "Deepa", "Divya", "Farhan",
+               "Gita", "Harish", "Imran", "Kavya", "Kiran", "Lakshmi", "Manoj", "Meera", "Neha", "Nikhil",
+               "Pooja", "Priya", "Rahul", "Ravi", "Rohan", "Sanjay", "Shreya", "Sunita", "Vikram", "Zoya"]
+LAST_NAMES = ["Sharma", "Verma", "Iyer", "Nair", "Reddy", "Patel", "Shah", "Gupta", "Singh", "Khan",
+              "Das", "Banerjee", "Mehta", "Joshi", "Kulkarni", "Menon", "Rao", "Pillai", "Chopra", "Bose"]
+RELATIONS = ["Wife", "Husband", "Mother", "Father", "Brother", "Sister", "Son", "Daughter", "Friend"]
+PARTNER_PHONE_SHARE = 0.7
+
+CHAINS = ["Apollo Pharmacy", "MedPlus", "Guardian Pharmacy", "Wellness Forever", "Frank Ross", "Netmeds Store"]
+LOCALITIES = ["MG Road", "Station Road", "Civil Lines", "Gandhi Nagar", "Nehru Nagar", "Market Road",
+              "Sector", "Old Town", "Bus Stand", "Ring Road", "Cantonment", "Lake View"]
+DOSAGES = ["0.25mg, 0.5mg", "0.25mg, 0.5mg, 1mg", "0.25mg, 0.5mg, 1mg, 1.7mg", "0.25mg, 0.5mg, 1mg, 1.7mg, 2.4mg", "Not available"]
+DOSAGE_WEIGHTS = [0.3, 0.25, 0.15, 0.1, 0.2]
+ONLINE_SHARE = 0.1
+
+USER_FIELDS = ["phone", "name", "age", "height", "weight", "checkins", "family_member", "state", "msg_count",
+               "city", "fam_name", "fam_relation", "onboarded_at", "last_checkin_at", "payment_status",
+               "last_msg_at", "updated_at"]
+
+def _label(n):
+    for size, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if n >= size and n % size == 0:
+            return f"{n // size}{suffix}"
+    return str(n)
+
+def _city_weights(cities):
+    # cities.csv is roughly ordered by population; Zipf-like falloff by rank.
+    w = 1.0 / np.arange(1, len(cities) + 1) ** 0.9
+    return w / w.sum()
+
+def _nullable(values, present):
+    return [v if p else None for v, p in zip(values, present)]
+
+# -------------------------------
+# Patients
+# -------------------------------
+def patient_chunk(seed, chunk, start, count, now, cities, city_p):
+    rng = np.random.default_rng([seed, 0, chunk])
+    idx = np.arange(start, start + count)
+    stage = rng.choice(len(STATES), size=count, p=STATE_WEIGHTS)
+    ready = stage == len(STATES) - 1
+
+    first = rng.choice(FIRST_NAMES, size=count)
+    last = rng.choice(LAST_NAMES, size=count)
+    female = rng.random(count) < 0.55
+    age = np.clip(rng.normal(46, 11, count), 18, 80).astype(np.int64)
+    height = np.round(np.where(female, rng.normal(155, 6.5, count), rng.normal(168, 7, count)))
+    bmi = np.clip(rng.normal(32, 5, count), 18, 55)
+    weight = np.round(bmi * (height / 100.0) ** 2, 1)
+    city = rng.choice(len(cities), size=count, p=city_p)
+    fam_first = rng.choice(FIRST_NAMES, size=count)
+    relation = rng.choice(RELATIONS, size=count)
+
+    # Ready patients: enrolled up to MAX_ENROLLED_WEEKS ago, each with their
+    # own adherence rate; check-ins can't outrun the weeks enrolled.
+    onboarded = now - rng.integers(0, MAX_ENROLLED_WEEKS * WEEK_SECONDS, count)
+    weeks = np.minimum((now - onboarded) // WEEK_SECONDS, PROGRAM_WEEKS)
+    checkins = np.where(ready, rng.binomial(weeks, rng.beta(4, 1.5, count)), 0)
+    last_checkin = np.minimum(onboarded + checkins * WEEK_SECONDS - rng.integers(0, 2 * DAY_SECONDS, count), now)
+    last_active = np.where(checkins > 0, last_checkin, onboarded)
+    last_msg = np.where(ready,
+                        np.minimum(last_active + rng.exponential(3 * DAY_SECONDS, count).astype(np.int64), now),
+                        now - rng.exponential(2 * DAY_SECONDS, count).astype(np.int64))
+    msg_count = np.where(ready, 10 + 2 * checkins + rng.poisson(4, count), stage + 1)
+
+    has = {field: stage > STATES.index(state) for field, state in
+           (("name", "awaiting_name"), ("age", "awaiting_age"), ("height", "awaiting_height"),
+            ("weight", "awaiting_weight"), ("city", "awaiting_city"), ("fam_name", "awaiting_family_name"),
+            ("fam_relation", "awaiting_family_relation"))}
+    names = [f"{a} {b}" for a, b in zip(first.tolist(), last.tolist())]
+    fam_names = fam_first.tolist()
+    relations = relation.tolist()
+    family = [f"{a} ({b})" for a, b in zip(fam_names, relations)]
+    phones = [f"+91{PATIENT_PHONE_BASE + i}" for i in idx.tolist()]
+    last_msg = last_msg.tolist()
+
+    users = list(zip(
+        phones,
+        _nullable(names, has["name"]),
+        _nullable(age.tolist(), has["age"]),
+        _nullable(height.tolist(), has["height"]),
+        _nullable(weight.tolist(), has["weight"]),
+        checkins.tolist(),
+        _nullable(family, has["fam_relation"]),
+        [STATES[s] for s in stage.tolist()],
+        msg_count.tolist(),
+        _nullable([cities[c] for c in city.tolist()], has["city"]),
+        _nullable(fam_names, has["fam_name"]),
+        _nullable(relations, has["fam_relation"]),
+        _nullable(onboarded.tolist(), ready),
+        _nullable(last_checkin.tolist(), ready & (checkins > 0)),
+        ["none"] * count,
+        last_msg,
+        last_msg,
+    ))
+
+    with_phone = rng.random(count) < PARTNER_PHONE_SHARE
+    partners = [(phones[i], fam_names[i], relations[i], f"+91{PARTNER_PHONE_BASE + idx[i]}" if with_phone[i] else None)
+                for i in np.flatnonzero(ready).tolist()]
+    return users, partners
+
+def write_patients(db, n, seed, now, chunk=CHUNK_ROWS):
+    init_db(db)
+    cities = list(default_gazetteer().cities)
+    city_p = _city_weights(cities)
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    # Secondary index is rebuilt once at the end instead of row by row.
+    conn.execute("DROP INDEX IF EXISTS idx_users_updated_at")
+    insert = f"INSERT INTO users ({', '.join(USER_FIELDS)}) VALUES ({', '.join('?' * len(USER_FIELDS))})"
+    started = time.monotonic()
+    for i, start in enumerate(range(0, n, chunk)):
+        users, partners = patient_chunk(seed, i, start, min(chunk, n - start), now, cities, city_p)
+        with conn:
+            conn.executemany(insert, users)
+            conn.executemany("INSERT INTO care_partners (patient_phone, name, relation, phone) VALUES (?, ?, ?, ?)", partners)
+        done = start + len(users)
+        print(f"  {done:>12,} patients  {done / (time.monotonic() - started):>10,.0f} rows/s", end="\r", flush=True)
+    print()
+    conn.close()
+    risk.init_tables(db)
+    # Wallets and ledger entries for existing check-ins come from the backfill.
+    ledger.init_tables(db, now)
+    return time.monotonic() - started
+
+# -------------------------------
+# Pharmacies
+# -------------------------------
+def pharmacy_chunk(seed, chunk, count, cities, city_p):
+    rng = np.random.default_rng([seed, 1, chunk])
+    city = rng.choice(len(cities), size=count, p=city_p)
+    chain = rng.choice(CHAINS, size=count)
+    locality = rng.choice(LOCALITIES, size=count)
+    block = rng.integers(1, 60, count)
+    # ~0.05° (5 km) spread around the city centroid.
+    lat = np.array([cities[c].lat for c in city.tolist()]) + rng.normal(0, 0.05, count)
+    lon = np.array([cities[c].lon for c in city.tolist()]) + rng.normal(0, 0.05, count)
+    kind = np.where(rng.random(count) < ONLINE_SHARE, "Online", "Offline")
+    dosages = rng.choice(DOSAGES, size=count, p=DOSAGE_WEIGHTS)
+    return [
+        (f"{ch} - {loc} {b}", round(la, 4), round(lo, 4), k, d, cities[c].name)
+        for ch, loc, b, la, lo, k, d, c in zip(chain.tolist(), locality.tolist(), block.tolist(), lat.tolist(),
+                                              lon.tolist(), kind.tolist(), dosages.tolist(), city.tolist())
+    ]
+
+def write_pharmacies(path, n, seed, chunk=CHUNK_ROWS):
+    cities = list(default_gazetteer().cities.values())
+    city_p = _city_weights(cities)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(["Name", "Latitude", "Longitude", "Type", "Dosages", "City"])
+        for i, start in enumerate(range(0, n, chunk)):
+            out.writerows(pharmacy_chunk(seed, i, min(chunk, n - start), cities, city_p))
+
+# -------------------------------
+# CLI
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("patients", type=int, help="number of patients, e.g. 10000, 1000000, 10000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--now", type=int, default=None, help="reference unix time (default: today 00:00 UTC)")
+    parser.add_argument("--db", default=None, help="output database (default: fixtures/cohort-<N>.db)")
+    parser.add_argument("--pharmacies", type=int, default=None, help="pharmacy rows (default: N/100, at least 5 per city)")
+    parser.add_argument("--pharmacy-csv", default=None, help="output CSV (default: fixtures/pharmacies-<N>.csv)")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing output database")
+    args = parser.parse_args(argv)
+
+    label = _label(args.patients)
+    db = args.db or os.path.join(FIXTURE_DIR, f"cohort-{label}.db")
+    csv_path = args.pharmacy_csv or os.path.join(FIXTURE_DIR, f"pharmacies-{label}.csv")
+    now = args.now or int(time.time()) // DAY_SECONDS * DAY_SECONDS
+    pharmacies = args.pharmacies or max(5 * len(default_gazetteer().cities), args.patients // 100)
+
+    if os.path.exists(db):
+        if not args.force:
+            print(f"⚠️ {db} already exists (use --force to overwrite)")
+            return 1
+        os.remove(db)
+    for path in (db, csv_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    print(f"🧪 Generating {args.patients:,} patients (seed {args.seed}, now {now}) into {db}")
+    secs = write_patients(db, args.patients, args.seed, now)
+    print(f"✅ Patients written in {secs:.1f}s")
+    write_pharmacies(csv_path, pharmacies, args.seed)
+    print(f"✅ {pharmacies:,} pharmacies written to {csv_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import datetime
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+# -------------------------------
+# Conversation log (audit trail)
+# -------------------------------
+# Every inbound/outbound WhatsApp message is queued in memory and written
+# by a background thread in batches, outside sampark.db. The queue is
+# bounded (MAX_QUEUED); when the writer can't keep up, new messages are
+# counted in `dropped` instead of growing memory. Until start() runs
+# (e.g. SAMPARK_CONVLOG=0) record() is a no-op. Storage is one
+# SQLite file per ISO week:
+#   conv-2026-W42.db         open week: messages(ts, phone, direction, body)
+#                            with an index on (phone, ts)
+#   conv-2026-W42.closed.db  closed week: one zlib-compressed JSON
+#                            transcript per phone (phone is the primary key)
+# Retention drops whole week files, so it costs the same however many
+# messages a week holds.
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations")
+RETENTION_WEEKS = 104
+FLUSH_SECONDS = 1.0
+FLUSH_BATCH = 500
+MAX_QUEUED = 50_000
+MAINTENANCE_SECONDS = 60 * 60
+
+_PARTITION_RE = re.compile(r"^conv-(\d{4})-W(\d{2})(\.closed)?\.db$")
+
+def week_of(ts):
+    year, week, _ = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isocalendar()
+    return year, week
+
+def _open_path(log_dir, year, week):
+    return os.path.join(log_dir, f"conv-{year}-W{week:02d}.db")
+
+def _closed_path(log_dir, year, week):
+    return os.path.join(log_dir, f"conv-{year}-W{week:02d}.closed.db")
+
+def partitions(log_dir=LOG_DIR):
+    # {(year, week): (path, closed)}
+    found = {}
+    if not os.path.isdir(log_dir):
+        return found
+    for name in os.listdir(log_dir):
+        m = _PARTITION_RE.match(name)
+        if m:
+            key = (int(m.group(1)), int(m.group(2)))
+            closed = bool(m.group(3))
+            if closed or key not in found:
+                found[key] = (os.path.join(log_dir, name), closed)
+    return found
+
+def _connect_open(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            ts REAL NOT NULL,
+            phone TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            body TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_phone ON messages(phone, ts)")
+    return conn
+
+# -------------------------------
+# Writer
+# -------------------------------
+class ConversationLog:
+    def __init__(self, log_dir=LOG_DIR, retention_weeks=RETENTION_WEEKS, max_queued=MAX_QUEUED):
+        self.log_dir = log_dir
+        self.retention_weeks = retention_weeks
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def record(self, phone, direction, body, ts=None):
+        # O(1) and never blocks on the request path; the writer thread does the I/O.
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((ts or time.time(), phone, direction, body))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+            self._thread.start()
+        return self
+
+    def _drain(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < FLUSH_BATCH:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        last_maintenance = 0
+        while True:
+            batch = self._drain(FLUSH_SECONDS)
+            if batch:
+                try:
+                    self.flush(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    print("⚠️ Conversation log write failed:", str(e))
+            if time.monotonic() - last_maintenance >= MAINTENANCE_SECONDS:
+                try:
+                    self.maintain()
+                except Exception as e:
+                    print("⚠️ Conversation log maintenance failed:", str(e))
+                last_maintenance = time.monotonic()
+
+    def flush(self, batch=None):
+        if batch is None:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        by_week = {}
+        for item in batch:
+            by_week.setdefault(week_of(item[0]), []).append(item)
+        os.makedirs(self.log_dir, exist_ok=True)
+        for (year, week), items in by_week.items():
+            if os.path.exists(_closed_path(self.log_dir, year, week)):
+                # Late arrival for a week that is already compacted: reopen it.
+                self._reopen(year, week)
+            conn = _connect_open(_open_path(self.log_dir, year, week))
+            with conn:
+                conn.executemany("INSERT INTO messages (ts, phone, direction, body) VALUES (?, ?, ?, ?)", items)
+            conn.close()
+        self.written += len(batch)
+        return len(batch)
+
+    # -------------------------------
+    # Compaction + retention
+    # -------------------------------
+    def maintain(self, now=None):
+        now = now or time.time()
+        current = week_of(now)
+        cutoff = week_of(now - self.retention_weeks * 7 * 24 * 60 * 60)
+        closed = dropped = 0
+        for key, (path, is_closed) in sorted(partitions(self.log_dir).items()):
+            if key < cutoff:
+                self._drop(*key)
+                dropped += 1
+            elif key < current and not is_closed:
+                self._close(*key)
+                closed += 1
+        return {"closed": closed, "dropped": dropped}
+
+    def _close(self, year, week):
+        src = _open_path(self.log_dir, year, week)
+        dst = _closed_path(self.log_dir, year, week)
+        tmp = dst + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(src)
+        out = sqlite3.connect(tmp)
+        out.execute("CREATE TABLE transcripts (phone TEXT PRIMARY KEY, messages INTEGER, data BLOB)")
+        phone, rows = None, []
+        def emit():
+            if rows:
+                out.execute("INSERT INTO transcripts VALUES (?, ?, ?)",
+                            (phone, len(rows), zlib.compress(json.dumps(rows).encode("utf-8"), 9)))
+        for p, ts, direction, body in conn.execute("SELECT phone, ts, direction, body FROM messages ORDER BY phone, ts"):
+            if p != phone:
+                emit()
+                phone, rows = p, []
+            rows.append([ts, direction, body])
+        emit()
+        out.commit()
+        out.close()
+        conn.close()
+        os.replace(tmp, dst)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(src + suffix):
+                os.remove(src + suffix)
+
+    def _reopen(self, year, week):
+        closed = _closed_path(self.log_dir, year, week)
+        conn = _connect_open(_open_path(self.log_dir, year, week))
+        src = sqlite3.connect(closed)
+        with conn:
+            for phone, data in src.execute("SELECT phone, data FROM transcripts"):
+                conn.executemany("INSERT INTO messages (ts, phone, direction, body) VALUES (?, ?, ?, ?)",
+                                 [(ts, phone, d, b) for ts, d, b in json.loads(zlib.decompress(data))])
+        src.close()
+        conn.close()
+        os.remove(closed)
+
+    def _drop(self, year, week):
+        for path in (_open_path(self.log_dir, year, week), _closed_path(self.log_dir, year, week)):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+# -------------------------------
+# Reader
+# -------------------------------
+def transcript(phone, since=None, log_dir=LOG_DIR):
+    # One indexed lookup per weekly partition.
+    since_key = week_of(since) if since else None
+    messages = []
+    for key, (path, closed) in sorted(partitions(log_dir).items()):
+        if since_key and key < since_key:
+            continue
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        if closed:
+            row = conn.execute("SELECT data FROM transcripts WHERE phone = ?", (phone,)).fetchone()
+            if row:
+                messages.extend(tuple(m) for m in json.loads(zlib.decompress(row[0])))
+        else:
+            messages.extend(conn.execute("SELECT ts, direction, body FROM messages WHERE phone = ? ORDER BY ts", (phone,)))
+        conn.close()
+    if since:
+        messages = [m for m in messages if m[0] >= since]
+    return messages
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "transcript":
+        for ts, direction, body in transcript(sys.argv[2]):
+            arrow = "→" if direction == "in" else "←"
+            print(f"{datetime.datetime.fromtimestamp(ts, datetime.timezone.utc):%Y-%m-%d %H:%M:%S} {arrow} {body}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "maintain":
+        print(ConversationLog().maintain())
+    else:
+        print("usage: python convlog.py transcript <phone> | maintain")
@@ -1,8 +1,11 @@
+import os
+
 import streamlit as st
-import sqlite3
 import pandas as pd
 import altair as alt
 from streamlit_autorefresh import st_autorefresh
+
+import snapshot
 # -----------------------
 # Page config
 # -----------------------
@@ -12,31 +15,17 @@ st.title("📊 Wegovy Sampark Dashboard")
 # -----------------------
 # DB config
 # -----------------------
-DB = "sampark.db"
+DB = os.environ.get("SAMPARK_DB", "sampark.db")
 
 # -----------------------
-# Helper functions
+# Shared snapshot (one DB reader per server, however many viewers)
 # -----------------------
-def calculate_bmi(height, weight):
-    try:
-        h_m = height / 100
-        bmi = weight / (h_m ** 2)
-        if bmi < 18.5:
-            category = "Underweight"
-        elif bmi < 25:
-            category = "Normal"
-        elif bmi < 30:
-            category = "Overweight"
-        else:
-            category = "Obese"
-        return round(bmi, 1), category
-    except:
-        return None, None
-
-def make_progress_bar(checkins, total=12):
-    filled = int((checkins / total) * 10) if total > 0 else 0
-    filled = max(0, min(10, filled))
-    return "▰" * filled + "▱" * (10 - filled)
+@st.cache_resource
+def snapshot_reader():
+    if os.environ.get("SAMPARK_SNAPSHOT_WRITER", "1") == "1":
+        snapshot.write_snapshot(DB)
+        snapshot.start_writer(DB)
+    return snapshot.SnapshotReader()
 
 # -----------------------
 # Auto-refresh every 5 seconds
@@ -44,30 +33,16 @@ def make_progress_bar(checkins, total=12):
 st_autorefresh(interval=5000, key="dashboard_refresh")
 
 # -----------------------
-# Read data from DB
+# Read data from the snapshot (BMI, category, adherence bar, masked phone
+# are already derived by the writer)
 # -----------------------
-conn = sqlite3.connect(DB)
-df = pd.read_sql("SELECT * FROM users", conn)
-conn.close()
+version, df = snapshot_reader().get()
+if df is None:
+    df = pd.DataFrame(columns=snapshot.COLUMNS)
 
 if df.empty:
     st.info("⚠️ No patients yet. Interact with the WhatsApp bot first.")
 else:
-    # Clamp checkins at 12
-    df["checkins"] = df["checkins"].clip(upper=12)
-
-    # Compute BMI
-    df["BMI"], df["BMI Category"] = zip(*df.apply(
-        lambda row: calculate_bmi(row["height"], row["weight"]) if (row["height"] and row["weight"]) else (None, None),
-        axis=1
-    ))
-
-    # Adherence progress bar
-    df["Adherence Progress"] = df["checkins"].apply(make_progress_bar)
-
-    # Mask phone numbers
-    df["phone_masked"] = df["phone"].apply(lambda x: f"*******{x[-3:]}" if x else "—")
-
     # Columns to display
     df_display = df[["phone_masked", "name", "age", "height", "weight",
                      "BMI", "BMI Category", "family_member", "checkins", "Adherence Progress"]].fillna("—")
@@ -78,6 +53,16 @@ else:
     st.subheader("Live Patients")
     st.dataframe(df_display, use_container_width=True)
 
+    # -----------------------
+    # At-risk patients (scored by risk.py)
+    # -----------------------
+    scored = df.dropna(subset=["Risk"])
+    if not scored.empty:
+        st.markdown("---")
+        st.subheader("⚠️ Most at risk of dropping out")
+        at_risk = scored.nlargest(20, "Risk")[["phone_masked", "name", "state", "checkins", "Adherence Progress", "Risk"]]
+        st.dataframe(at_risk.fillna("—"), use_container_width=True)
+
     st.markdown("---")
     st.subheader("📈 Summary")
     col1, col2, col3 = st.columns(3)
@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# -------------------------------
+# Care-partner notification fan-out
+# -------------------------------
+# The webhook only appends one row to care_events per check-in (O(1), no
+# matter how many partners a patient has). A background worker then:
+#   1. records a 'missed_week' event for ready patients with no check-in
+#      for a full week (one per missed week, de-duplicated by a unique key,
+#      and only during the PROGRAM_WEEKS after onboarding),
+#   2. claims a batch of pending events (stamps them with a claim token in
+#      one UPDATE, so concurrent workers in other processes never pick the
+#      same rows; a claim older than CLAIM_SECONDS is treated as abandoned)
+#      and joins them to care_partners,
+#   3. coalesces everything addressed to one partner into a single digest,
+#   4. sends digests in rate-limited rounds through a pluggable sender,
+#   5. marks sent events processed. An event whose digest failed for some
+#      partners keeps only those partners in owed_to and is retried once its
+#      claim expires, up to MAX_ATTEMPTS times.
+
+WEEK_SECONDS = 7 * 24 * 60 * 60
+PROGRAM_WEEKS = 12
+
+FANOUT_INTERVAL = 60
+MISSED_SCAN_INTERVAL = 60 * 60
+EVENT_BATCH = 500
+SEND_BATCH = 50
+SENDS_PER_SECOND = 10
+CLAIM_SECONDS = 10 * 60
+MAX_ATTEMPTS = 5
+
+# Columns added after the first release; init_tables() migrates older DBs.
+EVENT_COLUMNS = [
+    ("claim_token", "TEXT"),
+    ("claimed_at", "INTEGER"),
+    ("attempts", "INTEGER DEFAULT 0"),
+    ("owed_to", "TEXT"),
+]
+
+def init_tables(db):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS care_partners (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_phone TEXT NOT NULL,
+            name TEXT,
+            relation TEXT,
+            phone TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_care_partners_patient ON care_partners(patient_phone)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS care_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_phone TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            detail INTEGER,
+            dedupe TEXT,
+            created_at INTEGER NOT NULL,
+            processed_at INTEGER,
+            claim_token TEXT,
+            claimed_at INTEGER,
+            attempts INTEGER DEFAULT 0,
+            owed_to TEXT,
+            UNIQUE (patient_phone, kind, dedupe)
+        )
+    ''')
+    existing = {r[1] for r in c.execute("PRAGMA table_info(care_events)")}
+    for col, decl in EVENT_COLUMNS:
+        if col not in existing:
+            c.execute(f"ALTER TABLE care_events ADD COLUMN {col} {decl}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_care_events_pending ON care_events(processed_at, id)")
+    conn.commit()
+    conn.close()
+
+def add_partner(db, patient_phone, name, relation, phone):
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO care_partners (patient_phone, name, relation, phone) VALUES (?, ?, ?, ?)",
+                 (patient_phone, name, relation, phone))
+    conn.commit()
+    conn.close()
+
+def enqueue(db, patient_phone, kind, detail=None, now=None):
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT OR IGNORE INTO care_events (patient_phone, kind, detail, dedupe, created_at) VALUES (?, ?, ?, ?, ?)",
+                 (patient_phone, kind, detail, str(detail), int(now or time.time())))
+    conn.commit()
+    conn.close()
+
+def normalize_phone(raw):
+    digits = "".join(ch for ch in (raw or "") if ch.isdigit())
+    if len(digits) == 10:
+        return "+91" + digits
+    if 11 <= len(digits) <= 13:
+        return "+" + digits
+    return None
+
+# -------------------------------
+# Senders
+# -------------------------------
+class LogSender:
+    # Local stub: keeps what would have been sent (and prints it).
+    def __init__(self, quiet=False):
+        self.sent = []
+        self.quiet = quiet
+
+    def send(self, to, body):
+        self.sent.append((to, body))
+        if not self.quiet:
+            print(f"📤 [care-partner] to {to}: {body}")
+
+
+class TwilioSender:
+    def __init__(self, account_sid, auth_token, from_number):
+        from twilio.rest import Client
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, to, body):
+        self.client.messages.create(from_=f"whatsapp:{self.from_number}", to=f"whatsapp:{to}", body=body)
+
+
+def sender_from_env():
+    sid = os.environ.get("TWILIO_ACCOUNT_SID")
+    token = os.environ.get("TWILIO_AUTH_TOKEN")
+    from_number = os.environ.get("TWILIO_WHATSAPP_FROM")
+    if sid and token and from_number:
+        return TwilioSender(sid, token, from_number)
+    return LogSender()
+
+# -------------------------------
+# Worker
+# -------------------------------
+def scan_missed_weeks(db, now=None):
+    now = int(now or time.time())
+    conn = sqlite3.connect(db)
+    rows = conn.execute('''
+        SELECT phone, COALESCE(last_checkin_at, onboarded_at) FROM users
+        WHERE state = 'ready' AND checkins < ? AND COALESCE(last_checkin_at, onboarded_at) IS NOT NULL
+              AND COALESCE(last_checkin_at, onboarded_at) <= ?
+              AND COALESCE(onboarded_at, last_checkin_at) > ?
+    ''', (PROGRAM_WEEKS, now - WEEK_SECONDS, now - PROGRAM_WEEKS * WEEK_SECONDS)).fetchall()
+    # Keyed on (last check-in, weeks missed) so each missed week notifies once.
+    events = []
+    for phone, since in rows:
+        weeks = (now - since) // WEEK_SECONDS
+        events.append((phone, weeks, f"{since}:{weeks}", now))
+    conn.executemany("INSERT OR IGNORE INTO care_events (patient_phone, kind, detail, dedupe, created_at) VALUES (?, 'missed_week', ?, ?, ?)", events)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def _event_line(name, kind, detail):
+    who = name or "Your family member"
+    if kind == "checkin":
+        return f"✅ {who} completed week {detail}/{PROGRAM_WEEKS} of their Wegovy program."
+    if kind == "missed_week":
+        weeks = "a week" if detail == 1 else f"{detail} weeks"
+        return f"⏰ {who} hasn't checked in for {weeks}. A quick message of support can help!"
+    return f"ℹ️ Update from {who}."
+
+def claim_events(conn, limit=EVENT_BATCH, now=None):
+    # One statement under SQLite's write lock, so two workers can't both win a row.
+    now = int(now or time.time())
+    token = uuid.uuid4().hex
+    conn.execute('''
+        UPDATE care_events SET claim_token = ?, claimed_at = ?
+        WHERE id IN (SELECT id FROM care_events
+                     WHERE processed_at IS NULL AND (claimed_at IS NULL OR claimed_at <= ?)
+                     ORDER BY id LIMIT ?)
+    ''', (token, now, now - CLAIM_SECONDS, limit))
+    conn.commit()
+    return token
+
+def build_digests(db, limit=EVENT_BATCH, now=None):
+    conn = sqlite3.connect(db)
+    token = claim_events(conn, limit, now)
+    events = conn.execute('''
+        SELECT e.id, e.patient_phone, e.kind, e.detail, u.name, e.owed_to
+        FROM care_events e LEFT JOIN users u ON u.phone = e.patient_phone
+        WHERE e.claim_token = ? ORDER BY e.id
+    ''', (token,)).fetchall()
+    if not events:
+        conn.close()
+        return [], []
+
+    patient_phones = sorted({e[1] for e in events})
+    partners = {}
+    for i in range(0, len(patient_phones), 500):
+        chunk = patient_phones[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        for patient_phone, partner_phone in conn.execute(
+                f"SELECT patient_phone, phone FROM care_partners WHERE phone IS NOT NULL AND patient_phone IN ({marks})", chunk):
+            partners.setdefault(patient_phone, set()).add(partner_phone)
+    conn.close()
+
+    # digest entries: (to, body, ids of the events it carries)
+    lines, carried = {}, {}
+    for event_id, patient_phone, kind, detail, name, owed_to in events:
+        targets = partners.get(patient_phone, set())
+        if owed_to:
+            targets = targets & set(owed_to.split(","))
+        for partner_phone in targets:
+            lines.setdefault(partner_phone, []).append(_event_line(name, kind, detail))
+            carried.setdefault(partner_phone, []).append(event_id)
+
+    digests = [(to, "💙 Wegovy Sampark care update\n\n" + "\n".join(msgs), carried[to]) for to, msgs in sorted(lines.items())]
+    return [e[0] for e in events], digests
+
+def send_rounds(sender, digests, batch=SEND_BATCH, per_second=SENDS_PER_SECOND, sleep=time.sleep):
+    # Returns (number sent, digests that failed).
+    sent, failed = 0, []
+    for i in range(0, len(digests), batch):
+        started = time.monotonic()
+        for digest in digests[i:i + batch]:
+            to, body = digest[0], digest[1]
+            try:
+                sender.send(to, body)
+                sent += 1
+            except Exception as e:
+                failed.append(digest)
+                print(f"⚠️ Care-partner send to {to} failed:", str(e))
+        # Pace rounds so a batch never exceeds the provider's send rate.
+        wait = batch / per_second - (time.monotonic() - started)
+        if wait > 0 and i + batch < len(digests):
+            sleep(wait)
+    return sent, failed
+
+def mark_processed(db, event_ids, failed=(), now=None):
+    # Events carried only by sent digests are done. Events in a failed
+    # digest keep the partners still owed and are released for a retry once
+    # their claim expires (claimed_at is kept, which doubles as the backoff).
+    now = int(now or time.time())
+    owed = {}
+    for to, _, ids in failed:
+        for i in ids:
+            owed.setdefault(i, set()).add(to)
+    conn = sqlite3.connect(db)
+    conn.executemany("UPDATE care_events SET processed_at=? WHERE id=?", [(now, i) for i in event_ids if i not in owed])
+    if owed:
+        attempts = dict(conn.execute(f"SELECT id, attempts FROM care_events WHERE id IN ({','.join('?' * len(owed))})", list(owed)))
+        for i, partners in owed.items():
+            tries = (attempts.get(i) or 0) + 1
+            if tries >= MAX_ATTEMPTS:
+                print(f"⚠️ Care event {i} dropped after {tries} failed attempts")
+                conn.execute("UPDATE care_events SET processed_at=?, attempts=? WHERE id=?", (now, tries, i))
+            else:
+                conn.execute("UPDATE care_events SET claim_token=NULL, attempts=?, owed_to=? WHERE id=?",
+                             (tries, ",".join(sorted(partners)), i))
+    conn.commit()
+    conn.close()
+
+def run_once(db, sender, now=None, scan=True):
+    if scan:
+        scan_missed_weeks(db, now)
+    event_ids, digests = build_digests(db, now=now)
+    sent, failed = send_rounds(sender, digests)
+    mark_processed(db, event_ids, failed, now)
+    return {"events": len(event_ids), "digests": len(digests), "sent": sent, "failed": len(failed)}
+
+def start_worker(db, sender=None, interval=FANOUT_INTERVAL):
+    sender = sender or sender_from_env()
+    def loop():
+        last_scan = 0
+        while True:
+            try:
+                scan = time.monotonic() - last_scan >= MISSED_SCAN_INTERVAL
+                run_once(db, sender, scan=scan)
+                if scan:
+                    last_scan = time.monotonic()
+            except Exception as e:
+                print("⚠️ Care-partner fan-out failed:", str(e))
+            time.sleep(interval)
+    t = threading.Thread(target=loop, name="care-partner-fanout", daemon=True)
+    t.start()
+    return t
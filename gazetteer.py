@@ -0,0 +1,197 @@
+import bisect
+import csv
+import difflib
+import math
+import os
+import re
+import threading
+
+# -------------------------------
+# City gazetteer + national pharmacy index
+# -------------------------------
+# cities.csv lists Indian cities with aliases and centroid coordinates.
+# Every alias (and the canonical name) is normalized to a key and kept in a
+# sorted array, which doubles as a prefix index: exact hits and unique
+# prefixes ("bengal", "vizag") are a bisect away. Anything else falls back
+# to difflib over aliases sharing the first letter, so "banglore" or
+# "chenai" still resolve. A fuzzy hit is only taken when it is one dropped,
+# doubled or swapped letter away (two for longer names) and no other city is
+# as close; a changed letter counts as two, since swapping one letter often
+# spells a different real place ("Rampur" is not "Raipur").
+#
+# pharmacies_with_dosages.csv is the single national pharmacy file; rows
+# are grouped by their City column, pre-sorted by distance from that city's
+# centroid, and located with a bisect on the sorted city keys.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CITIES_CSV = os.path.join(HERE, "cities.csv")
+PHARMACIES_CSV = os.path.join(HERE, "pharmacies_with_dosages.csv")
+
+MIN_PREFIX = 4
+FUZZY_CUTOFF = 0.8
+LONG_NAME = 8  # keys this long may be two typo edits away instead of one
+
+def _key(text):
+    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+
+def _typo_distance(a, b):
+    # Edit distance counting insertions, deletions and adjacent swaps as one
+    # edit and a substitution as two.
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 2
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class City:
+    __slots__ = ("name", "state", "lat", "lon")
+
+    def __init__(self, name, state, lat, lon):
+        self.name = name
+        self.state = state
+        self.lat = lat
+        self.lon = lon
+
+    def __repr__(self):
+        return f"City({self.name!r}, {self.state!r}, {self.lat}, {self.lon})"
+
+
+class Gazetteer:
+    def __init__(self, path=CITIES_CSV):
+        self.cities = {}
+        pairs = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                city = City(row["City"].strip(), row["State"].strip(), float(row["Latitude"]), float(row["Longitude"]))
+                self.cities[city.name] = city
+                for alias in [city.name] + (row.get("Aliases") or "").split("|"):
+                    k = _key(alias)
+                    if k:
+                        pairs.setdefault(k, city)
+        self._keys = sorted(pairs)
+        self._values = [pairs[k] for k in self._keys]
+        self._by_letter = {}
+        for k in self._keys:
+            self._by_letter.setdefault(k[0], []).append(k)
+
+    def aliases(self):
+        return [(k, c.name) for k, c in zip(self._keys, self._values)]
+
+    def resolve(self, text):
+        key = _key(text)
+        if not key:
+            return None
+
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._values[i]
+
+        if len(key) >= MIN_PREFIX:
+            j = bisect.bisect_left(self._keys, key + "\uffff", lo=i)
+            hits = {self._values[n].name for n in range(i, j)}
+            if len(hits) == 1:
+                return self._values[i]
+
+        candidates = self._by_letter.get(key[0], ())
+        allowed = 2 if len(key) >= LONG_NAME else 1
+        best, hits = allowed, {}
+        for match in difflib.get_close_matches(key, candidates, n=5, cutoff=FUZZY_CUTOFF):
+            d = _typo_distance(key, match)
+            if d > allowed:
+                continue
+            city = self._values[bisect.bisect_left(self._keys, match)]
+            if d < best or not hits:
+                best, hits = d, {city.name: city}
+            elif d == best:
+                hits[city.name] = city
+        if len(hits) == 1:
+            return next(iter(hits.values()))
+        return None
+
+    def coordinates(self, name):
+        city = self.cities.get(name) or self.resolve(name)
+        return (city.lat, city.lon) if city else None
+
+
+class PharmacyIndex:
+    def __init__(self, gazetteer, path=PHARMACIES_CSV):
+        self.gazetteer = gazetteer
+        groups = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                city = gazetteer.resolve(row.get("City") or "")
+                if city is None:
+                    continue
+                row["Latitude"], row["Longitude"] = float(row["Latitude"]), float(row["Longitude"])
+                row["City"] = city.name
+                row["_km"] = haversine_km(city.lat, city.lon, row["Latitude"], row["Longitude"])
+                groups.setdefault(city.name, []).append(row)
+
+        self._cities = sorted(groups)
+        self._offsets = []
+        self._rows = []
+        for name in self._cities:
+            self._offsets.append(len(self._rows))
+            self._rows.extend(sorted(groups[name], key=lambda r: r["_km"]))
+        self._offsets.append(len(self._rows))
+
+    def cities(self):
+        return list(self._cities)
+
+    def in_city(self, name, limit=None):
+        i = bisect.bisect_left(self._cities, name)
+        if i == len(self._cities) or self._cities[i] != name:
+            return []
+        start, end = self._offsets[i], self._offsets[i + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._rows[start:end]
+
+    def nearest_city(self, name):
+        # Nearest city (by centroid) that has pharmacies on file.
+        here = self.gazetteer.cities.get(name)
+        if here is None or not self._cities:
+            return None, None
+        best = min(self._cities, key=lambda c: haversine_km(here.lat, here.lon, *self.gazetteer.coordinates(c)))
+        return best, haversine_km(here.lat, here.lon, *self.gazetteer.coordinates(best))
+
+# -------------------------------
+# Process-wide instances
+# -------------------------------
+_lock = threading.Lock()
+_gazetteer = None
+_pharmacies = None
+_pharmacies_mtime = None
+
+def default_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
+
+def pharmacy_index():
+    # Rebuilt only when the national pharmacy file changes on disk.
+    # SAMPARK_PHARMACIES points at another file (e.g. a cohort.py fixture).
+    global _pharmacies, _pharmacies_mtime
+    path = os.environ.get("SAMPARK_PHARMACIES", PHARMACIES_CSV)
+    mtime = (path, os.path.getmtime(path))
+    if _pharmacies is None or mtime != _pharmacies_mtime:
+        with _lock:
+            if _pharmacies is None or mtime != _pharmacies_mtime:
+                _pharmacies = PharmacyIndex(default_gazetteer(), path)
+                _pharmacies_mtime = mtime
+    return _pharmacies
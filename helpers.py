@@ -0,0 +1,111 @@
+import difflib
+import math
+import re
+
+from gazetteer import default_gazetteer
+
+# -------------------------------
+# Shared helpers (bot, prototype and dashboard)
+# -------------------------------
+# app.py, app3.py and dashboard.py used to carry their own copies of these
+# and they drifted (weight not coerced to float, progress bar clamped on one
+# side only, FAQ matching by difflib in one and by substring in the other).
+# Keep a single implementation here.
+
+def calculate_bmi(height_cm, weight_kg):
+    try:
+        h_m = float(height_cm) / 100.0
+        bmi = float(weight_kg) / (h_m ** 2)
+        if not (math.isfinite(h_m) and math.isfinite(bmi)) or bmi <= 0:
+            return None, None
+        if bmi < 18.5: category = "Underweight"
+        elif bmi < 25: category = "Normal"
+        elif bmi < 30: category = "Overweight"
+        else: category = "Obese"
+        return round(bmi, 1), category
+    except (TypeError, ValueError, ZeroDivisionError, OverflowError):
+        return None, None
+
+def make_progress_bar(current, total=12):
+    filled = int((current / total) * 10) if total > 0 else 0
+    filled = max(0, min(10, filled))
+    return "▰" * filled + "▱" * (10 - filled)
+
+# -------------------------------
+# City Normalization
+# -------------------------------
+# Aliases, fuzzy matching and coordinates come from the gazetteer
+# (cities.csv); unknown cities are kept as typed, title-cased.
+def normalize_city(city: str):
+    city = (city or "").strip()
+    if not city:
+        return None
+    match = default_gazetteer().resolve(city)
+    return match.name if match else city.title()
+
+# -------------------------------
+# Relation Normalization
+# -------------------------------
+_REL_MAP = {
+    "brother": "Sibling", "sister": "Sibling", "sibling": "Sibling",
+    "mom": "Parent", "mother": "Parent", "mum": "Parent",
+    "dad": "Parent", "father": "Parent",
+    "husband": "Spouse", "wife": "Spouse", "spouse": "Spouse",
+    "friend": "Friend", "buddy": "Friend"
+}
+
+RELATIONS = ["Spouse", "Parent", "Sibling", "Friend", "Other"]
+
+def normalize_relation(raw: str) -> str:
+    if not raw: return "Other"
+    key = re.sub(r'[^a-zA-Z]', '', raw).lower().strip()
+    if key in _REL_MAP: return _REL_MAP[key]
+    title = raw.strip().title()
+    if title in RELATIONS: return title
+    return "Other"
+
+# -------------------------------
+# FAQ matching
+# -------------------------------
+# Full questions (what the bot's users type) plus short topic keywords (what
+# the prototype's "Ask a Question" box suggests). Exact question, then
+# keyword, then a loose difflib match over the questions.
+FAQS = {
+    "what are side effects": "🤒 Common side effects: nausea, vomiting, constipation. Ginger tea + small meals help.\n(Type 'doctor' to connect to our experts)",
+    "how to store wegovy": "🧊 Store in fridge (2-8°C). Do not freeze.",
+    "can i take it at night": "🕒 Yes, morning or night — keep your schedule consistent.",
+    "what to do if i miss a dose": "💉 If <5 days late: take as soon as you remember. If >5 days: skip and continue your normal schedule.",
+    "how to reduce nausea": "🍵 Ginger tea, small frequent meals, avoid greasy food, stay hydrated.",
+    "when will i see weight loss": "📊 Usually between 4–8 weeks, varies by patient.",
+    "can i exercise": "🏃 Yes — combine diet + exercise for best results.",
+    "who should not take wegovy": "⚠️ Those with thyroid cancer history or MEN2 syndrome should avoid. Consult doctor.",
+    "what is the price": "💰 Price varies by pharmacy. Type 'doctor' to ask clinical or cost queries.",
+    "can i drink alcohol": "🍷 Light alcohol is usually safe, but avoid if it worsens nausea."
+}
+
+FAQ_KEYWORDS = {
+    "what are side effects": ("side effect",),
+    "how to store wegovy": ("storage", "store", "fridge"),
+    "can i take it at night": ("dose timing", "night", "morning"),
+    "what to do if i miss a dose": ("missed dose", "miss a dose"),
+    "how to reduce nausea": ("nausea",),
+    "when will i see weight loss": ("weight loss",),
+    "can i exercise": ("exercise", "workout"),
+    "who should not take wegovy": ("contraindication", "should not take", "thyroid"),
+    "what is the price": ("price", "cost"),
+    "can i drink alcohol": ("alcohol",),
+}
+
+FAQ_CUTOFF = 0.4
+
+def find_answer(user_text):
+    text = " ".join(re.sub(r"[^a-z0-9 ]+", " ", (user_text or "").lower()).split())
+    if not text:
+        return None
+    if text in FAQS:
+        return FAQS[text]
+    for question, keywords in FAQ_KEYWORDS.items():
+        if any(k in text for k in keywords):
+            return FAQS[question]
+    matches = difflib.get_close_matches(text, FAQS.keys(), n=1, cutoff=FAQ_CUTOFF)
+    return FAQS[matches[0]] if matches else None
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import threading
+import time
+import urllib.parse
+from xml.etree import ElementTree
+
+import requests
+
+# -------------------------------
+# Knowledge Hub content bundle
+# -------------------------------
+# A background refresher pulls PubMed / ClinicalTrials.gov into a versioned,
+# gzip-compressed JSON bundle on disk. Request paths only ever read the
+# bundle that is already loaded in memory, so serving never waits on the
+# network. New versions are published by writing the file first and then
+# atomically replacing the CURRENT pointer with os.replace.
+
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+POINTER = "CURRENT"
+KEEP_VERSIONS = 3
+REFRESH_SECONDS = 6 * 60 * 60
+
+PUBMED_QUERY = "Wegovy AND Novo Nordisk AND obesity"
+TRIALS_QUERY = "Wegovy Novo Nordisk"
+MAX_ARTICLES = 5
+MAX_TRIALS = 5
+
+SUCCESS_STORIES = [
+    {"title": "Novo Nordisk announces Wegovy approval for obesity management","description": "Wegovy has been approved as a treatment for adults with obesity, showing significant efficacy in clinical trials.","url": "https://www.novonordisk.com/media/news-details.2337680.html","source": "Novo Nordisk News"},
+    {"title": "Clinical trial results: Wegovy for weight management","description": "Phase 3 clinical trials demonstrate substantial weight loss in patients treated with Wegovy.","url": "https://www.ncbi.nlm.nih.gov/pmc/articles/PMC8463470/","source": "PubMed Central"},
+    {"title": "Real-world outcomes with Wegovy","description": "Patients using Wegovy report positive weight management outcomes, supporting clinical trial results.","url": "https://www.ncbi.nlm.nih.gov/pmc/articles/PMC8569585/","source": "PubMed Central"}
+]
+
+EMPTY_BUNDLE = {"version": 0, "built_at": None, "articles": [], "trials": [], "stories": SUCCESS_STORIES}
+
+# -------------------------------
+# Fetchers (refresher only)
+# -------------------------------
+def fetch_pubmed(query=PUBMED_QUERY, max_results=MAX_ARTICLES):
+    base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+    search_url = f"{base_url}esearch.fcgi?db=pubmed&term={urllib.parse.quote(query)}&retmax={max_results}&retmode=json"
+    try:
+        search_resp = requests.get(search_url, timeout=10).json()
+        pmids = search_resp.get("esearchresult", {}).get("idlist", [])
+    except Exception:
+        return None
+    articles = []
+    for pmid in pmids:
+        try:
+            fetch_url = f"{base_url}efetch.fcgi?db=pubmed&id={pmid}&retmode=xml"
+            root = ElementTree.fromstring(requests.get(fetch_url, timeout=10).text)
+            articles.append({"pmid": pmid, "title": root.findtext(".//ArticleTitle"), "abstract": root.findtext(".//AbstractText")})
+        except Exception:
+            continue
+    return articles
+
+def fetch_clinical_trials(query=TRIALS_QUERY, max_results=MAX_TRIALS):
+    api_url = f"https://clinicaltrials.gov/api/query/study_fields?expr={urllib.parse.quote(query)}&fields=BriefTitle,Condition,OverallStatus,URL&min_rnk=1&max_rnk={max_results}&fmt=json"
+    try:
+        resp = requests.get(api_url, timeout=10)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        return None
+    trials = []
+    for study in data.get("StudyFieldsResponse", {}).get("StudyFields", []):
+        trials.append({"title": study.get("BriefTitle", ["No title"])[0], "condition": study.get("Condition", [""])[0], "status": study.get("OverallStatus", [""])[0], "url": study.get("URL", [""])[0]})
+    return trials
+
+# -------------------------------
+# On-disk bundle
+# -------------------------------
+def _bundle_path(version, bundle_dir=BUNDLE_DIR):
+    return os.path.join(bundle_dir, f"bundle-{version}.json.gz")
+
+def _atomic_write(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def current_version(bundle_dir=BUNDLE_DIR):
+    try:
+        with open(os.path.join(bundle_dir, POINTER)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+def load_bundle(version=None, bundle_dir=BUNDLE_DIR):
+    version = current_version(bundle_dir) if version is None else version
+    if not version:
+        return dict(EMPTY_BUNDLE)
+    try:
+        with gzip.open(_bundle_path(version, bundle_dir), "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict(EMPTY_BUNDLE)
+
+def build_bundle(bundle_dir=BUNDLE_DIR, fetch_articles=fetch_pubmed, fetch_trials=fetch_clinical_trials):
+    os.makedirs(bundle_dir, exist_ok=True)
+    previous = load_bundle(bundle_dir=bundle_dir)
+    articles = fetch_articles()
+    trials = fetch_trials()
+    # Keep the last good section when an upstream API is down.
+    if articles is None:
+        articles = previous["articles"]
+    if trials is None:
+        trials = previous["trials"]
+
+    version = max(int(time.time()), previous["version"] + 1)
+    bundle = {
+        "version": version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "articles": articles,
+        "trials": trials,
+        "stories": previous.get("stories") or SUCCESS_STORIES,
+    }
+    _atomic_write(_bundle_path(version, bundle_dir), gzip.compress(json.dumps(bundle).encode("utf-8")))
+    _atomic_write(os.path.join(bundle_dir, POINTER), str(version).encode())
+    _prune(bundle_dir, version)
+    return bundle
+
+def _prune(bundle_dir, keep_from):
+    versions = []
+    for name in os.listdir(bundle_dir):
+        if name.startswith("bundle-") and name.endswith(".json.gz"):
+            try:
+                versions.append(int(name[len("bundle-"):-len(".json.gz")]))
+            except ValueError:
+                continue
+    for v in sorted(versions)[:-KEEP_VERSIONS]:
+        if v != keep_from:
+            try:
+                os.remove(_bundle_path(v, bundle_dir))
+            except OSError:
+                pass
+
+# -------------------------------
+# In-memory store + refresher
+# -------------------------------
+class BundleStore:
+    def __init__(self, bundle_dir=BUNDLE_DIR):
+        self.bundle_dir = bundle_dir
+        self._bundle = load_bundle(bundle_dir=bundle_dir)
+        self._thread = None
+
+    def get(self):
+        # Single reference read; a swap never exposes a half-built bundle.
+        return self._bundle
+
+    def reload_if_changed(self):
+        version = current_version(self.bundle_dir)
+        if version and version != self._bundle["version"]:
+            self._bundle = load_bundle(version, self.bundle_dir)
+        return self._bundle
+
+    def refresh(self):
+        self._bundle = build_bundle(self.bundle_dir)
+        return self._bundle
+
+    def start_refresher(self, interval=REFRESH_SECONDS):
+        if self._thread is not None:
+            return
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("⚠️ Knowledge bundle refresh failed:", str(e))
+                time.sleep(interval)
+        self._thread = threading.Thread(target=loop, name="knowledge-bundle-refresh", daemon=True)
+        self._thread.start()
+
+if __name__ == "__main__":
+    b = build_bundle()
+    print(f"✅ Built bundle v{b['version']}: {len(b['articles'])} articles, {len(b['trials'])} trials")
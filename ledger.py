@@ -0,0 +1,157 @@
+import math
+import sqlite3
+import sys
+import time
+
+# -------------------------------
+# Commit & Earn: points ledger, wallets and cashback settlement
+# -------------------------------
+# points_ledger is append-only; every award has a (phone, reason, ref) key so
+# replays are no-ops (a check-in's ref is its program week, so one per
+# week). wallets holds the materialized balance and cashback state per
+# patient and is updated in the same transaction as the check-in, so a
+# wallet read is one primary-key lookup. settle() decides cashback for
+# the whole cohort in one set-based statement and is safe to re-run.
+
+PROGRAM = "wegovy-12wk"
+PROGRAM_WEEKS = 12
+WEEK_SECONDS = 7 * 24 * 60 * 60
+POINTS_PER_CHECKIN = 10
+CASHBACK_AMOUNT = 500
+CASHBACK_ADHERENCE = 0.9
+
+def init_tables(db, now=None):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            UNIQUE (phone, reason, ref)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS wallets (
+            phone TEXT PRIMARY KEY,
+            points INTEGER NOT NULL DEFAULT 0,
+            weeks INTEGER NOT NULL DEFAULT 0,
+            cashback INTEGER NOT NULL DEFAULT 0,
+            cashback_status TEXT NOT NULL DEFAULT 'none',
+            updated_at INTEGER
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS payouts (
+            phone TEXT NOT NULL,
+            program TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (phone, program)
+        )
+    ''')
+    # Carry over check-ins recorded before the ledger existed (runs once per patient).
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone():
+        now = int(now or time.time())
+        c.execute('''
+            INSERT OR IGNORE INTO points_ledger (phone, delta, reason, ref, created_at)
+            SELECT phone, checkins * ?, 'backfill', 'initial', ? FROM users
+            WHERE checkins > 0 AND phone NOT IN (SELECT phone FROM wallets)
+        ''', (POINTS_PER_CHECKIN, now))
+        c.execute('''
+            INSERT OR IGNORE INTO wallets (phone, points, weeks, updated_at)
+            SELECT phone, checkins * ?, checkins, ? FROM users WHERE checkins > 0
+        ''', (POINTS_PER_CHECKIN, now))
+    conn.commit()
+    conn.close()
+
+def record_checkin(db, phone, now=None):
+    # Returns (checkins, status): status is "recorded", "this_week" (already
+    # checked in during this program week) or "complete" (all weeks done).
+    # The ledger key is the program week since onboarding, so repeated
+    # check-ins inside one week earn nothing and don't advance the count.
+    now = int(now or time.time())
+    conn = sqlite3.connect(db, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT checkins, onboarded_at FROM users WHERE phone = ?", (phone,)).fetchone()
+        if row is None:
+            conn.execute("ROLLBACK")
+            return 0, "complete"
+        checkins, onboarded_at = row[0] or 0, row[1]
+        if checkins >= PROGRAM_WEEKS:
+            conn.execute("ROLLBACK")
+            return checkins, "complete"
+        if onboarded_at is None:
+            # Patients onboarded before onboarded_at existed start the clock now.
+            onboarded_at = now
+            conn.execute("UPDATE users SET onboarded_at = ? WHERE phone = ?", (now, phone))
+        program_week = max(0, now - onboarded_at) // WEEK_SECONDS + 1
+        cur = conn.execute("INSERT OR IGNORE INTO points_ledger (phone, delta, reason, ref, created_at) VALUES (?, ?, 'checkin', ?, ?)",
+                           (phone, POINTS_PER_CHECKIN, str(program_week), now))
+        if cur.rowcount == 0:
+            conn.execute("ROLLBACK")
+            return checkins, "this_week"
+        conn.execute("UPDATE users SET checkins = checkins + 1, last_checkin_at = ?, updated_at = ? WHERE phone = ?",
+                     (now, now, phone))
+        conn.execute('''
+            INSERT INTO wallets (phone, points, weeks, updated_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT(phone) DO UPDATE SET points = points + excluded.points, weeks = weeks + 1, updated_at = excluded.updated_at
+        ''', (phone, POINTS_PER_CHECKIN, now))
+        conn.execute("COMMIT")
+        return checkins + 1, "recorded"
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def wallet(db, phone):
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT points, weeks, cashback, cashback_status FROM wallets WHERE phone = ?", (phone,)).fetchone()
+    conn.close()
+    if row is None:
+        return {"points": 0, "weeks": 0, "cashback": 0, "cashback_status": "none"}
+    return dict(zip(("points", "weeks", "cashback", "cashback_status"), row))
+
+def settle(db, now=None):
+    # One pass over the cohort: every wallet at or above the adherence bar
+    # gets a payout row (idempotent via the primary key) and its wallet and
+    # users.payment_status are flagged in the same transaction.
+    now = int(now or time.time())
+    min_weeks = math.ceil(PROGRAM_WEEKS * CASHBACK_ADHERENCE)
+    conn = sqlite3.connect(db, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.execute('''
+            INSERT OR IGNORE INTO payouts (phone, program, amount, created_at)
+            SELECT phone, ?, ?, ? FROM wallets WHERE weeks >= ?
+        ''', (PROGRAM, CASHBACK_AMOUNT, now, min_weeks))
+        created = cur.rowcount
+        conn.execute('''
+            UPDATE wallets SET cashback = ?, cashback_status = 'pending', updated_at = ?
+            WHERE cashback_status = 'none' AND phone IN (SELECT phone FROM payouts WHERE program = ?)
+        ''', (CASHBACK_AMOUNT, now, PROGRAM))
+        conn.execute('''
+            UPDATE users SET payment_status = 'cashback_pending'
+            WHERE COALESCE(payment_status, 'none') = 'none' AND phone IN (SELECT phone FROM payouts WHERE program = ?)
+        ''', (PROGRAM,))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return {"new_payouts": created, "min_weeks": min_weeks}
+
+if __name__ == "__main__":
+    db = sys.argv[1] if len(sys.argv) > 1 else "sampark.db"
+    init_tables(db)
+    result = settle(db)
+    print(f"✅ Settlement done: {result['new_payouts']} new payouts (≥{result['min_weeks']} weeks)")
@@ -0,0 +1,124 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+
+from flask import abort, request, send_file
+
+# -------------------------------
+# Media serving
+# -------------------------------
+# Only files inside MEDIA_DIR are served, and only if they are in the
+# manifest (name -> size, mtime, sha256). The content hash is the strong
+# ETag and is also put in links as ?v=<hash>; only requests carrying the
+# current hash are cached for a year as immutable, anything else gets a
+# short max-age and revalidates by ETag. Unknown names trigger a rescan (at
+# most every RESCAN_SECONDS) so files added after startup are picked up.
+#
+# send_file(conditional=True) answers If-None-Match with 304 and Range with
+# 206 partial content (resumable/seekable video). Full 200 responses hand
+# the open file to the WSGI server's file_wrapper, which uses sendfile()
+# under gunicorn; 206 responses go through werkzeug's range wrapper, which
+# reads and copies each chunk in Python. To make seeks zero-copy as well,
+# put nginx in front and serve MEDIA_DIR from there.
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media")
+MAX_AGE = 365 * 24 * 60 * 60
+UNVERSIONED_MAX_AGE = 60
+RESCAN_SECONDS = 10
+HASH_CHUNK = 1024 * 1024
+
+
+class MediaEntry:
+    __slots__ = ("path", "size", "mtime", "etag", "mimetype")
+
+    def __init__(self, path, size, mtime, etag, mimetype):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.mimetype = mimetype
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaLibrary:
+    def __init__(self, root=MEDIA_DIR):
+        self.root = os.path.realpath(root)
+        self._manifest = {}
+        self._lock = threading.Lock()
+        self._scanned_at = 0.0
+        self.rescan()
+
+    def rescan(self):
+        # Re-hashes only files whose size or mtime changed.
+        manifest = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, files in os.walk(self.root):
+                for fname in files:
+                    if fname.startswith("."):
+                        continue
+                    path = os.path.join(dirpath, fname)
+                    name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    st = os.stat(path)
+                    old = self._manifest.get(name)
+                    if old and old.size == st.st_size and old.mtime == st.st_mtime:
+                        manifest[name] = old
+                        continue
+                    mimetype = mimetypes.guess_type(fname)[0] or "application/octet-stream"
+                    manifest[name] = MediaEntry(path, st.st_size, st.st_mtime, _sha256(path)[:32], mimetype)
+        with self._lock:
+            self._manifest = manifest
+            self._scanned_at = time.monotonic()
+        return len(manifest)
+
+    def get(self, name):
+        entry = self._manifest.get(name)
+        if entry is None:
+            if time.monotonic() - self._scanned_at < RESCAN_SECONDS:
+                return None
+            self.rescan()
+            return self._manifest.get(name)
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            self.rescan()
+            return self._manifest.get(name)
+        if st.st_size != entry.size or st.st_mtime != entry.mtime:
+            self.rescan()
+            entry = self._manifest.get(name)
+        return entry
+
+    def url_for(self, name, base_url=""):
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return f"{base_url.rstrip('/')}/media/{name}?v={entry.etag[:12]}"
+
+    def manifest(self):
+        return {name: {"size": e.size, "etag": e.etag, "mimetype": e.mimetype} for name, e in self._manifest.items()}
+
+    def serve(self, name):
+        entry = self.get(name)
+        if entry is None:
+            abort(404)
+        versioned = request.args.get("v") == entry.etag[:12]
+        resp = send_file(
+            entry.path,
+            mimetype=entry.mimetype,
+            conditional=True,
+            etag=entry.etag,
+            last_modified=entry.mtime,
+            max_age=MAX_AGE if versioned else UNVERSIONED_MAX_AGE,
+        )
+        resp.headers["Accept-Ranges"] = "bytes"
+        resp.cache_control.public = True
+        resp.cache_control.immutable = versioned
+        return resp
@@ -0,0 +1,149 @@
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+
+# -------------------------------
+# In-process patient profile cache
+# -------------------------------
+# Read-through LRU in front of the users table. Every write in app.py goes
+# through update_field(), which writes the DB first and then patches the
+# cached record, so the cache never serves a value the DB doesn't have.
+# A miss loads outside the lock; writes that land while a load is in
+# flight bump that phone's generation, and the loaded row is then dropped
+# instead of cached (it may predate the write).
+#
+# Sizing: a record is a __slots__ object (no per-instance __dict__) and the
+# handful of repeated strings (state, city, relation) are interned, so one
+# entry costs roughly 550-650 bytes including the phone key, the LRU node
+# and the per-patient strings. 1M active patients therefore fit in a
+# ~640 MB budget; see PatientCache.stats()["bytes_per_entry"] for the
+# measured figure.
+#
+# The cache is per process: run the webhook as a single worker process
+# (threads are fine) or lower MAX_ENTRIES and accept per-worker staleness.
+
+FIELDS = ("name", "age", "height", "weight", "checkins", "family_member",
+          "state", "msg_count", "city", "fam_name", "fam_relation")
+
+MAX_ENTRIES = 1_000_000
+MEMORY_BUDGET_BYTES = 640 * 1024 * 1024
+
+_CACHED = set(FIELDS)
+_INTERNED = {"state", "city", "fam_relation"}
+
+
+def _compact(field, value):
+    if field in _INTERNED and isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class PatientRecord:
+    __slots__ = FIELDS
+
+    def __init__(self, row):
+        for field, value in zip(FIELDS, row):
+            setattr(self, field, _compact(field, value))
+
+    def as_row(self):
+        return tuple(getattr(self, f) for f in FIELDS)
+
+
+class PatientCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}  # phone -> [generation, loaders in flight]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, phone, loader):
+        with self._lock:
+            rec = self._records.get(phone)
+            if rec is not None:
+                self._records.move_to_end(phone)
+                self.hits += 1
+                return rec.as_row()
+            self.misses += 1
+            pending = self._loading.setdefault(phone, [0, 0])
+            pending[1] += 1
+            generation = pending[0]
+
+        row = None
+        try:
+            row = loader(phone)
+        finally:
+            # Generation check, insert and deregistration in one critical
+            # section: once the phone leaves _loading a write can no longer
+            # bump it, so nothing may be cached after that point.
+            with self._lock:
+                if row is not None and pending[0] == generation and phone not in self._records:
+                    self._records[phone] = PatientRecord(row)
+                    while len(self._records) > self.max_entries:
+                        self._records.popitem(last=False)
+                        self.evictions += 1
+                pending[1] -= 1
+                if pending[1] == 0:
+                    del self._loading[phone]
+        return row
+
+    def _bump(self, phone):
+        pending = self._loading.get(phone)
+        if pending is not None:
+            pending[0] += 1
+
+    def set_field(self, phone, field, value):
+        if field not in _CACHED:
+            return
+        with self._lock:
+            rec = self._records.get(phone)
+            if rec is not None:
+                setattr(rec, field, _compact(field, value))
+            else:
+                self._bump(phone)
+
+    def invalidate(self, phone=None):
+        with self._lock:
+            if phone is None:
+                self._records.clear()
+                for p in list(self._loading):
+                    self._bump(p)
+            else:
+                self._records.pop(phone, None)
+                self._bump(phone)
+
+    def bytes_per_entry(self, sample=1000):
+        # Approximate: record + phone key + OrderedDict slot/link overhead
+        # + non-interned field values, averaged over the most recent entries.
+        with self._lock:
+            # Walk back from the newest entry; copying the whole LRU here
+            # would hold the lock for seconds at 1M entries.
+            items = list(itertools.islice(reversed(self._records.items()), sample))
+        if not items:
+            return 0
+        total = 0
+        for phone, rec in items:
+            total += sys.getsizeof(rec) + sys.getsizeof(phone) + 100
+            for f in FIELDS:
+                v = getattr(rec, f)
+                if v is not None and f not in _INTERNED:
+                    total += sys.getsizeof(v)
+        return total // len(items)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        per_entry = self.bytes_per_entry()
+        return {
+            "entries": len(self._records),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_per_entry": per_entry,
+            "projected_bytes_at_max": per_entry * self.max_entries,
+            "memory_budget_bytes": MEMORY_BUDGET_BYTES,
+        }
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+# -------------------------------
+# Token-bucket rate limiter (per phone)
+# -------------------------------
+# Each phone gets one bucket per budget. Every option is now answered from
+# local data (the knowledge bundle, the pharmacy index, the ledger), so a
+# single "cheap" budget covers all traffic; add a budget here if an option
+# starts doing real work per request again. Buckets live in an LRU so
+# memory stays bounded; idle buckets are dropped because a bucket that has
+# been quiet long enough is full again anyway.
+
+BUDGETS = {
+    # name: (capacity, refill tokens per second)
+    "cheap": (20, 20 / 60.0),
+}
+
+MAX_BUCKETS = 100_000
+IDLE_SECONDS = 15 * 60
+
+
+class _Bucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens, stamp):
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+class RateLimiter:
+    def __init__(self, budgets=None, max_buckets=MAX_BUCKETS, idle_seconds=IDLE_SECONDS, clock=time.monotonic):
+        self.budgets = dict(budgets or BUDGETS)
+        self.max_buckets = max_buckets
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = {name: 0 for name in self.budgets}
+        self.throttled = {name: 0 for name in self.budgets}
+        self.evicted = 0
+
+    def allow(self, phone, budget="cheap"):
+        capacity, rate = self.budgets[budget]
+        key = (phone, budget)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(capacity, now)
+                self._buckets[key] = bucket
+            else:
+                bucket.tokens = min(capacity, bucket.tokens + (now - bucket.stamp) * rate)
+                bucket.stamp = now
+                self._buckets.move_to_end(key)
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                self.allowed[budget] += 1
+                ok = True
+            else:
+                self.throttled[budget] += 1
+                ok = False
+
+            self._evict(now)
+        return ok
+
+    def _evict(self, now):
+        # Oldest entries sit at the front; stop at the first one still in use.
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) > self.max_buckets or now - bucket.stamp > self.idle_seconds:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+            else:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "allowed": dict(self.allowed),
+                "throttled": dict(self.throttled),
+                "evicted": self.evicted,
+            }
+
+
+THROTTLED_REPLY = "⏳ You're sending messages too quickly. Please wait a minute and try again."
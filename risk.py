@@ -0,0 +1,160 @@
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+# -------------------------------
+# Adherence-risk scoring
+# -------------------------------
+# Streams users out of SQLite in CHUNK_ROWS chunks, computes features for a
+# whole chunk at once with NumPy and writes the scores back with one
+# executemany per chunk, so memory stays flat however big the cohort is.
+#
+# Features:
+#   checkin_deficit  weeks enrolled (capped at 12) minus check-ins
+#   days_since_msg   days since the patient last messaged the bot
+#   stuck            still in an onboarding state and silent for STUCK_DAYS
+# Patients who finished all 12 weeks score 0.
+#
+# Incremental runs only rescore rows whose users.updated_at moved since the
+# previous run started (indexed). Time-based features age without the row
+# changing, so run a --full pass nightly, e.g. from cron:
+#   */15 * * * *  python risk.py sampark.db
+#   30 2 * * *    python risk.py --full sampark.db
+
+PROGRAM_WEEKS = 12
+WEEK_SECONDS = 7 * 24 * 60 * 60
+DAY_SECONDS = 24 * 60 * 60
+CHUNK_ROWS = 50_000
+STUCK_DAYS = 2
+MAX_SILENT_DAYS = 30
+
+# Logistic weights: score = 1 / (1 + exp(-(BIAS + W·features)))
+BIAS = -3.0
+W_DEFICIT = 1.2
+W_SILENT = 0.12
+W_STUCK = 2.0
+
+def init_tables(db):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS risk_scores (
+            phone TEXT PRIMARY KEY,
+            score REAL NOT NULL,
+            weeks_enrolled INTEGER,
+            checkin_deficit INTEGER,
+            days_since_msg REAL,
+            stuck INTEGER,
+            scored_at INTEGER NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_risk_scores_score ON risk_scores(score DESC)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS risk_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at INTEGER NOT NULL,
+            finished_at INTEGER,
+            mode TEXT NOT NULL,
+            scored INTEGER
+        )
+    ''')
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone():
+        c.execute("CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at)")
+    conn.commit()
+    conn.close()
+
+def _column(rows, i):
+    # NULL -> NaN so missing timestamps flow through the vector maths.
+    return np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float64)
+
+def score_chunk(rows, now):
+    # rows: (phone, state, checkins, onboarded_at, last_msg_at, updated_at)
+    checkins = np.nan_to_num(_column(rows, 2))
+    onboarded = _column(rows, 3)
+    last_seen = _column(rows, 4)
+    for i in (5, 3):
+        last_seen = np.where(np.isnan(last_seen), _column(rows, i), last_seen)
+    ready = np.array([r[1] == "ready" for r in rows])
+
+    weeks = np.clip(np.nan_to_num(np.floor((now - onboarded) / WEEK_SECONDS)), 0, PROGRAM_WEEKS)
+    deficit = np.clip(weeks - checkins, 0, PROGRAM_WEEKS)
+    days = np.clip(np.nan_to_num((now - last_seen) / DAY_SECONDS, nan=MAX_SILENT_DAYS), 0, None)
+    stuck = ~ready & (days >= STUCK_DAYS)
+
+    z = BIAS + W_DEFICIT * deficit + W_SILENT * np.minimum(days, MAX_SILENT_DAYS) + W_STUCK * stuck
+    score = np.where(checkins >= PROGRAM_WEEKS, 0.0, 1.0 / (1.0 + np.exp(-z)))
+
+    return list(zip(
+        (r[0] for r in rows),
+        np.round(score, 4).tolist(),
+        weeks.astype(np.int64).tolist(),
+        deficit.astype(np.int64).tolist(),
+        np.round(days, 1).tolist(),
+        stuck.astype(np.int64).tolist(),
+        [int(now)] * len(rows),
+    ))
+
+def last_run(db):
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT started_at FROM risk_runs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def run(db, full=False, now=None, chunk=CHUNK_ROWS):
+    now = int(now or time.time())
+    since = None if full else last_run(db)
+    mode = "full" if since is None else "incremental"
+
+    conn = sqlite3.connect(db)
+    run_id = conn.execute("INSERT INTO risk_runs (started_at, mode) VALUES (?, ?)", (now, mode)).lastrowid
+    conn.commit()
+
+    query = "SELECT phone, state, checkins, onboarded_at, last_msg_at, updated_at FROM users"
+    params = ()
+    if since is not None:
+        query += " WHERE updated_at >= ?"
+        params = (since,)
+    reader = conn.execute(query, params)
+    writer = conn.cursor()
+    scored = 0
+    while True:
+        rows = reader.fetchmany(chunk)
+        if not rows:
+            break
+        writer.executemany('''
+            INSERT INTO risk_scores (phone, score, weeks_enrolled, checkin_deficit, days_since_msg, stuck, scored_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(phone) DO UPDATE SET score = excluded.score, weeks_enrolled = excluded.weeks_enrolled,
+                checkin_deficit = excluded.checkin_deficit, days_since_msg = excluded.days_since_msg,
+                stuck = excluded.stuck, scored_at = excluded.scored_at
+        ''', score_chunk(rows, now))
+        conn.commit()
+        scored += len(rows)
+
+    conn.execute("UPDATE risk_runs SET finished_at = ?, scored = ? WHERE id = ?", (int(time.time()), scored, run_id))
+    conn.commit()
+    conn.close()
+    return {"mode": mode, "scored": scored}
+
+def top_at_risk(db, limit=20):
+    # Walks idx_risk_scores_score; no sort over the cohort.
+    conn = sqlite3.connect(db)
+    rows = conn.execute('''
+        SELECT r.phone, u.name, r.score, r.checkin_deficit, r.days_since_msg, r.stuck
+        FROM risk_scores r JOIN users u ON u.phone = r.phone
+        ORDER BY r.score DESC LIMIT ?
+    ''', (limit,)).fetchall()
+    conn.close()
+    return rows
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    full = "--full" in args
+    args = [a for a in args if a != "--full"]
+    db = args[0] if args else "sampark.db"
+    init_tables(db)
+    started = time.monotonic()
+    result = run(db, full=full)
+    print(f"✅ Risk scoring ({result['mode']}): {result['scored']} patients in {time.monotonic() - started:.1f}s")
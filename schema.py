@@ -0,0 +1,59 @@
+import sqlite3
+
+import fanout
+import ledger
+import risk
+
+# -------------------------------
+# Database schema
+# -------------------------------
+# The users table and every module's tables, created/migrated in one place.
+# No import side effects, so tools (cohort.py, ad-hoc scripts) can build a
+# database without pulling in Flask/Twilio or starting the bot's workers.
+
+# Columns added after the first release; init_db() migrates older DBs.
+USER_COLUMNS = [
+    ("msg_count", "INTEGER DEFAULT 0"),
+    ("city", "TEXT"),
+    ("fam_name", "TEXT"),
+    ("fam_relation", "TEXT"),
+    ("onboarded_at", "INTEGER"),
+    ("last_checkin_at", "INTEGER"),
+    ("payment_status", "TEXT DEFAULT 'none'"),
+    ("last_msg_at", "INTEGER"),
+    ("updated_at", "INTEGER"),
+]
+
+def init_db(db):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            phone TEXT PRIMARY KEY,
+            name TEXT,
+            age INTEGER,
+            height REAL,
+            weight REAL,
+            checkins INTEGER DEFAULT 0,
+            family_member TEXT,
+            state TEXT DEFAULT 'new',
+            msg_count INTEGER DEFAULT 0,
+            city TEXT,
+            fam_name TEXT,
+            fam_relation TEXT,
+            onboarded_at INTEGER,
+            last_checkin_at INTEGER,
+            payment_status TEXT DEFAULT 'none',
+            last_msg_at INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+    existing = {r[1] for r in c.execute("PRAGMA table_info(users)")}
+    for col, decl in USER_COLUMNS:
+        if col not in existing:
+            c.execute(f"ALTER TABLE users ADD COLUMN {col} {decl}")
+    conn.commit()
+    conn.close()
+    fanout.init_tables(db)
+    ledger.init_tables(db)
+    risk.init_tables(db)
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from helpers import make_progress_bar
+
+# -------------------------------
+# Shared patient snapshot (Arrow/Feather)
+# -------------------------------
+# One writer polls the database every SNAPSHOT_SECONDS. PRAGMA data_version
+# (bumped by any other connection's commit, including risk.py runs) tells
+# it whether anything was written; only then does it scan users, derive the
+# dashboard columns (BMI, category, adherence bar, masked phone) and, if
+# the content changed, write snapshots/patients-<version>.arrow
+# (uncompressed Feather v2 so it can be memory-mapped) and atomically
+# swaps the CURRENT pointer. Readers memory-map the current file and only
+# re-read when the version changes, so N viewers cost one DB scan per change
+# and one copy of the numeric columns in the page cache.
+#
+# The raw phone number never leaves sampark.db; only phone_masked does.
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+POINTER = "CURRENT"
+SNAPSHOT_SECONDS = 5
+KEEP_VERSIONS = 3
+
+COLUMNS = ["phone_masked", "name", "age", "height", "weight", "BMI", "BMI Category",
+           "family_member", "checkins", "Adherence Progress", "msg_count", "state", "Risk"]
+
+def derive(df):
+    df = df.copy()
+    df["checkins"] = pd.to_numeric(df["checkins"], errors="coerce").fillna(0).clip(upper=12).astype("int64")
+
+    # Vectorized calculate_bmi(): same thresholds, same rounding.
+    h = pd.to_numeric(df["height"], errors="coerce") / 100.0
+    w = pd.to_numeric(df["weight"], errors="coerce")
+    bmi = (w / (h ** 2)).where((h > 0) & (w > 0))
+    df["BMI"] = bmi.round(1)
+    df["BMI Category"] = np.select(
+        [bmi < 18.5, bmi < 25, bmi < 30, bmi >= 30],
+        ["Underweight", "Normal", "Overweight", "Obese"],
+        default=None,
+    )
+
+    bars = {c: make_progress_bar(c) for c in range(13)}
+    df["Adherence Progress"] = df["checkins"].map(bars)
+    if "risk" in df.columns:
+        df["Risk"] = pd.to_numeric(df["risk"], errors="coerce")
+    df["phone_masked"] = df["phone"].map(lambda x: f"*******{x[-3:]}" if x else "—")
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    return df[COLUMNS].reset_index(drop=True)
+
+def read_patients(db):
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        scored = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'risk_scores'").fetchone()
+        if scored:
+            query = "SELECT u.*, r.score AS risk FROM users u LEFT JOIN risk_scores r ON r.phone = u.phone"
+        else:
+            query = "SELECT * FROM users"
+        df = pd.read_sql(query, conn)
+    finally:
+        conn.close()
+    return derive(df)
+
+# -------------------------------
+# Writer
+# -------------------------------
+def _path(version, snapshot_dir):
+    return os.path.join(snapshot_dir, f"patients-{version}.arrow")
+
+def current_version(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, POINTER)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+def _fingerprint(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+def write_snapshot(db, snapshot_dir=SNAPSHOT_DIR, last_fingerprint=None):
+    # Returns (version, fingerprint); version is None when nothing changed.
+    df = read_patients(db)
+    fp = _fingerprint(df)
+    if fp == last_fingerprint:
+        return None, fp
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    version = max(time.time_ns() // 1000, current_version(snapshot_dir) + 1)
+    path = _path(version, snapshot_dir)
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path + ".tmp", compression="uncompressed")
+    os.replace(path + ".tmp", path)
+    pointer = os.path.join(snapshot_dir, POINTER)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(str(version))
+    os.replace(pointer + ".tmp", pointer)
+
+    old = sorted(n for n in os.listdir(snapshot_dir) if n.startswith("patients-") and n.endswith(".arrow"))
+    for name in old[:-KEEP_VERSIONS]:
+        try:
+            os.remove(os.path.join(snapshot_dir, name))
+        except OSError:
+            pass
+    return version, fp
+
+def data_version(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def start_writer(db, snapshot_dir=SNAPSHOT_DIR, interval=SNAPSHOT_SECONDS):
+    def loop():
+        fp = seen = None
+        # data_version is per connection, so the watcher has to stay open.
+        watch = sqlite3.connect(f"file:{db}?mode=ro", uri=True, check_same_thread=False)
+        while True:
+            try:
+                version = data_version(watch)
+                if fp is None or version != seen:
+                    _, fp = write_snapshot(db, snapshot_dir, fp)
+                    seen = version
+            except Exception as e:
+                print("⚠️ Patient snapshot failed:", str(e))
+            time.sleep(interval)
+    t = threading.Thread(target=loop, name="patient-snapshot", daemon=True)
+    t.start()
+    return t
+
+# -------------------------------
+# Reader
+# -------------------------------
+def load_snapshot(version, snapshot_dir=SNAPSHOT_DIR):
+    # memory_map=True: Arrow buffers point straight into the page cache, and
+    # numeric columns stay views of them in pandas. String columns (names,
+    # state, category, progress bar) are materialized as Python objects, so
+    # each process pays for those once per snapshot version.
+    table = feather.read_table(_path(version, snapshot_dir), memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+class SnapshotReader:
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.version = 0
+        self.frame = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = current_version(self.snapshot_dir)
+        if version and version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.frame = load_snapshot(version, self.snapshot_dir)
+                    self.version = version
+        return self.version, self.frame
+
+if __name__ == "__main__":
+    db = sys.argv[1] if len(sys.argv) > 1 else "sampark.db"
+    version, _ = write_snapshot(db)
+    print(f"✅ Snapshot v{version} written to {SNAPSHOT_DIR}")